@@ -3,14 +3,27 @@
 __version__ = "2.12.1"
 
 import abc
+import asyncio
 import json
 import time
-from collections.abc import Callable, Iterator, MutableMapping
+from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableMapping
 from typing import Any, TypedDict, cast
 
 from aiohttp import web
 from aiohttp.typedefs import Handler, Middleware
 
+from .compression import (
+    Compressor,
+    compress_payload,
+    decompress_payload,
+    is_compressed,
+)
+from .codecs import Codec, TextCodec
+from .conflict import ConflictHandler
+from .deferred import DeferredWriter
+from .metrics import SessionObserver
+from .timing import TIMINGS_KEY, format_server_timing, phase
+
 
 class _CookieParams(TypedDict, total=False):
     domain: str | None
@@ -27,6 +40,11 @@ class SessionData(TypedDict, total=False):
     session: dict[str, Any]
 
 
+class SessionDelta(TypedDict):
+    updated: dict[str, Any]
+    deleted: frozenset[str]
+
+
 class Session(MutableMapping[str, Any]):
 
     """Session dict-like object."""
@@ -38,27 +56,64 @@ class Session(MutableMapping[str, Any]):
         data: SessionData | None,
         new: bool,
         max_age: int | None = None,
+        loader: Callable[[], SessionData | None] | None = None,
     ) -> None:
         self._changed: bool = False
+        self._full_save: bool = False
+        self._updated_keys: set[str] = set()
+        self._deleted_keys: set[str] = set()
         self._mapping: dict[str, Any] = {}
-        self._identity = identity if data != {} else None
-        self._new = new if data != {} else True
+        self._identity = identity
+        self._new = new
         self._max_age = max_age
+        self._created = 0
+        self._loaded_created: int | None = None
+        # Encoded payload as loaded by a storage created with skip_unchanged
+        # or compare_and_set, and the backend's CAS token of it if any.
+        self._loaded_payload: bytes | None = None
+        self._cas_token: int | None = None
+        # Set by storages with sliding expiry: the last time the backend
+        # extended the session lifetime and whether it's due again.
+        self._refreshed: int | None = None
+        self._refresh_due = False
+        # Data is decoded on first access when a loader is given.
+        self._loader = loader
+        if loader is None:
+            self._load(data)
+
+    def _load(self, data: SessionData | None) -> None:
+        if data == {}:
+            self._identity = None
+            self._new = True
         created = data.get("created", None) if data else None
         session_data = data.get("session", None) if data else None
         now = int(time.time())
         age = now - created if created else now
-        if max_age is not None and age > max_age:
+        if self._refreshed is not None:
+            age = min(age, now - self._refreshed)
+        if self._max_age is not None and age > self._max_age:
             session_data = None
         if self._new or created is None:
             self._created = now
         else:
             self._created = created
+            if session_data is not None:
+                self._loaded_created = created
 
         if session_data is not None:
             self._mapping.update(session_data)
+        else:
+            # Nothing usable was loaded, a partial update can't be applied.
+            self._full_save = True
+
+    def _load_pending(self) -> None:
+        loader = self._loader
+        if loader is not None:
+            self._loader = None
+            self._load(loader())
 
     def __repr__(self) -> str:
+        self._load_pending()
         return "<{} [new:{}, changed:{}, created:{}] {!r}>".format(
             self.__class__.__name__,
             self.new,
@@ -69,18 +124,26 @@ class Session(MutableMapping[str, Any]):
 
     @property
     def new(self) -> bool:
+        if self._loader is not None:
+            self._load_pending()
         return self._new
 
     @property
     def identity(self) -> Any | None:
+        if self._loader is not None:
+            self._load_pending()
         return self._identity
 
     @property
     def created(self) -> int:
+        if self._loader is not None:
+            self._load_pending()
         return self._created
 
     @property
     def empty(self) -> bool:
+        if self._loader is not None:
+            self._load_pending()
         return not bool(self._mapping)
 
     @property
@@ -91,44 +154,85 @@ class Session(MutableMapping[str, Any]):
     def max_age(self, value: int | None) -> None:
         self._max_age = value
 
+    @property
+    def delta(self) -> SessionDelta | None:
+        """Keys set and deleted since the session was loaded.
+
+        ``None`` means the whole session has to be saved: it is new, was
+        invalidated or :meth:`changed` was called for an in-place mutation.
+        """
+        if self._loader is not None:
+            self._load_pending()
+        if self._new or self._full_save:
+            return None
+        return {
+            "updated": {key: self._mapping[key] for key in self._updated_keys},
+            "deleted": frozenset(self._deleted_keys),
+        }
+
     def changed(self) -> None:
+        if self._loader is not None:
+            self._load_pending()
         self._changed = True
+        self._full_save = True
 
     def invalidate(self) -> None:
+        if self._loader is not None:
+            self._load_pending()
         self._changed = True
+        self._full_save = True
         self._mapping = {}
 
     def set_new_identity(self, identity: Any | None) -> None:
+        if self._loader is not None:
+            self._load_pending()
         if not self._new:
             raise RuntimeError("Can't change identity for a session which is not new")
 
         self._identity = identity
 
     def __len__(self) -> int:
+        if self._loader is not None:
+            self._load_pending()
         return len(self._mapping)
 
     def __iter__(self) -> Iterator[str]:
+        if self._loader is not None:
+            self._load_pending()
         return iter(self._mapping)
 
     def __contains__(self, key: object) -> bool:
+        if self._loader is not None:
+            self._load_pending()
         return key in self._mapping
 
     def __getitem__(self, key: str) -> Any:
+        if self._loader is not None:
+            self._load_pending()
         return self._mapping[key]
 
     def __setitem__(self, key: str, value: Any) -> None:
+        if self._loader is not None:
+            self._load_pending()
         self._mapping[key] = value
         self._changed = True
+        self._updated_keys.add(key)
+        self._deleted_keys.discard(key)
         self._created = int(time.time())
 
     def __delitem__(self, key: str) -> None:
+        if self._loader is not None:
+            self._load_pending()
         del self._mapping[key]
         self._changed = True
+        self._deleted_keys.add(key)
+        self._updated_keys.discard(key)
         self._created = int(time.time())
 
 
 SESSION_KEY = "aiohttp_session"
 STORAGE_KEY = "aiohttp_session_storage"
+PREFETCH_KEY = "aiohttp_session_prefetch"
 
 
 async def get_session(request: web.Request) -> Session:
@@ -140,7 +244,12 @@ async def get_session(request: web.Request) -> Session:
                 "Install aiohttp_session middleware " "in your aiohttp.web.Application"
             )
 
-        session = await storage.load_session(request)
+        prefetch: asyncio.Task[Session] | None = request.pop(PREFETCH_KEY, None)
+        with phase(request, "load"):
+            if prefetch is not None:
+                session = await prefetch
+            else:
+                session = await _load_session(storage, request)
         if not isinstance(session, Session):
             raise RuntimeError(
                 "Installed {!r} storage should return session instance "
@@ -167,13 +276,86 @@ async def new_session(request: web.Request) -> Session:
     return session
 
 
-def session_middleware(storage: "AbstractStorage") -> Middleware:
+async def _load_session(storage: "AbstractStorage", request: web.Request) -> Session:
+    # get_session() also accepts duck-typed storages set on the request.
+    observer = getattr(storage, "observer", None)
+    if observer is None:
+        return await storage.load_session(request)
+    start = time.perf_counter()
+    session = await storage.load_session(request)
+    if isinstance(session, Session):
+        # Session.new would decode a session loaded with lazy_decode.
+        observer.on_load(storage, time.perf_counter() - start, session._new)
+    return session
+
+
+def _discard_prefetch(request: web.Request) -> None:
+    prefetch: asyncio.Task[Session] | None = request.pop(PREFETCH_KEY, None)
+    if prefetch is None:
+        return
+    if prefetch.done():
+        if not prefetch.cancelled():
+            # Mark the exception as retrieved, nobody asked for the session.
+            prefetch.exception()
+    else:
+        prefetch.cancel()
+
+
+async def _save_session(
+    storage: "AbstractStorage",
+    request: web.Request,
+    response: web.StreamResponse,
+    session: Session,
+    writer: DeferredWriter | None,
+) -> None:
+    if writer is not None:
+        # Storages which can split saving write the whole session later,
+        # a delta would be written before the response is sent.
+        write = storage.prepare_save(request, response, session)
+        if write is not None:
+            await writer.submit(write, session.identity)
+            return
+    delta = session.delta
+    if delta is not None:
+        await storage.save_session_delta(request, response, session, delta)
+    else:
+        await storage.save_session(request, response, session)
+
+
+def session_middleware(
+    storage: "AbstractStorage",
+    *,
+    prefetch: bool = False,
+    exclude_paths: Iterable[str] = (),
+    exclude_routes: Iterable[str] = (),
+    writer: DeferredWriter | None = None,
+    server_timing: bool = False,
+) -> Middleware:
     if not isinstance(storage, AbstractStorage):
         raise RuntimeError(f"Expected AbstractStorage got {storage}")
+    # Paths match whole segments: "/static" excludes "/static" and
+    # "/static/app.js", not "/staticfoo". str.startswith() accepts a
+    # tuple and checks all prefixes in C.
+    excluded_paths = frozenset(exclude_paths)
+    excluded_prefixes = tuple(path.rstrip("/") + "/" for path in excluded_paths)
+    excluded_routes = frozenset(exclude_routes)
+    observer = storage.observer
 
     @web.middleware
     async def factory(request: web.Request, handler: Handler) -> web.StreamResponse:
+        if excluded_paths and (
+            request.path in excluded_paths
+            or request.path.startswith(excluded_prefixes)
+        ):
+            return await handler(request)
+        if excluded_routes and request.match_info.route.name in excluded_routes:
+            return await handler(request)
         request[STORAGE_KEY] = storage
+        if server_timing:
+            request[TIMINGS_KEY] = {}
+        if prefetch and storage.load_cookie(request) is not None:
+            # Overlap loading the session with the handler's own work.
+            request[PREFETCH_KEY] = asyncio.create_task(_load_session(storage, request))
         raise_response = False
         # TODO aiohttp 4:
         # Remove Union from response, and drop the raise_response variable
@@ -183,6 +365,9 @@ def session_middleware(storage: "AbstractStorage") -> Middleware:
         except web.HTTPException as exc:
             response = exc
             raise_response = True
+        finally:
+            if prefetch:
+                _discard_prefetch(request)
         if not isinstance(response, (web.StreamResponse, web.HTTPException)):
             raise RuntimeError(f"Expect response, not {type(response)!r}")
         if not isinstance(response, (web.Response, web.HTTPException)):
@@ -192,8 +377,22 @@ def session_middleware(storage: "AbstractStorage") -> Middleware:
             raise RuntimeError("Cannot save session data into prepared response")
         session = request.get(SESSION_KEY)
         if session is not None:
-            if session._changed:
-                await storage.save_session(request, response, session)
+            if session._changed and not storage._is_unchanged(session):
+                start = time.perf_counter()
+                with phase(request, "save"):
+                    await _save_session(storage, request, response, session, writer)
+                if observer is not None:
+                    observer.on_save(storage, time.perf_counter() - start)
+            elif session._refresh_due:
+                start = time.perf_counter()
+                with phase(request, "refresh"):
+                    await storage.refresh_session(request, response, session)
+                if observer is not None:
+                    observer.on_refresh(storage, time.perf_counter() - start)
+        if server_timing and request[TIMINGS_KEY]:
+            response.headers.add(
+                "Server-Timing", format_server_timing(request[TIMINGS_KEY])
+            )
         if raise_response:
             raise cast(web.HTTPException, response)
         return response
@@ -201,10 +400,30 @@ def session_middleware(storage: "AbstractStorage") -> Middleware:
     return factory
 
 
-def setup(app: web.Application, storage: "AbstractStorage") -> None:
+def setup(
+    app: web.Application,
+    storage: "AbstractStorage",
+    *,
+    prefetch: bool = False,
+    exclude_paths: Iterable[str] = (),
+    exclude_routes: Iterable[str] = (),
+    writer: DeferredWriter | None = None,
+    server_timing: bool = False,
+) -> None:
     """Setup the library in aiohttp fashion."""
 
-    app.middlewares.append(session_middleware(storage))
+    app.middlewares.append(
+        session_middleware(
+            storage,
+            prefetch=prefetch,
+            exclude_paths=exclude_paths,
+            exclude_routes=exclude_routes,
+            writer=writer,
+            server_timing=server_timing,
+        )
+    )
+    if writer is not None:
+        app.cleanup_ctx.append(writer.cleanup_ctx)
 
 
 class AbstractStorage(metaclass=abc.ABCMeta):
@@ -220,7 +439,14 @@ class AbstractStorage(metaclass=abc.ABCMeta):
         samesite: str | None = None,
         encoder: Callable[[object], str] = json.dumps,
         decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        compressor: Compressor | None = None,
+        compress_threshold: int = 256,
+        codec: Codec | None = None,
     ) -> None:
+        if compress_threshold < 0:
+            raise ValueError("compress_threshold should be non-negative")
         self._cookie_name = cookie_name
         self._cookie_params = _CookieParams(
             domain=domain,
@@ -233,6 +459,15 @@ class AbstractStorage(metaclass=abc.ABCMeta):
         self._max_age = max_age
         self._encoder = encoder
         self._decoder = decoder
+        if codec is None:
+            codec = TextCodec(encoder, decoder)
+        elif encoder is not json.dumps or decoder is not json.loads:
+            raise ValueError("codec can't be combined with encoder and decoder")
+        self._codec = codec
+        self._skip_unchanged = skip_unchanged
+        self._observer = observer
+        self._compressor = compressor
+        self._compress_threshold = compress_threshold
 
     @property
     def cookie_name(self) -> str:
@@ -246,12 +481,87 @@ class AbstractStorage(metaclass=abc.ABCMeta):
     def cookie_params(self) -> _CookieParams:
         return self._cookie_params
 
+    @property
+    def observer(self) -> SessionObserver | None:
+        return self._observer
+
     def _get_session_data(self, session: Session) -> SessionData:
         if session.empty:
             return {}
 
         return {"created": session.created, "session": session._mapping}
 
+    def _encode_payload(
+        self, data: SessionData, request: web.Request | None = None
+    ) -> bytes:
+        """Encode *data*, compressed if it reaches the compress threshold."""
+        with phase(request, "encode"):
+            payload = self._codec.encode(data)
+        compressor = self._compressor
+        if compressor is not None and len(payload) >= self._compress_threshold:
+            with phase(request, "compress"):
+                payload = compress_payload(payload, compressor)
+        return payload
+
+    def _is_unchanged(self, session: Session) -> bool:
+        """Check if saving *session* would write back the loaded payload."""
+        if not self._skip_unchanged:
+            return False
+        loaded = session._loaded_payload
+        created = session._loaded_created
+        if loaded is None or created is None or session.max_age != self.max_age:
+            return False
+        if session.empty:
+            return False
+        # Setting a key refreshes "created", compare against the loaded one.
+        data: SessionData = {"created": created, "session": session._mapping}
+        if is_compressed(loaded):
+            try:
+                loaded = decompress_payload(loaded, self._compressor)
+            except ValueError:
+                return False
+        return self._codec.encode(data) == loaded
+
+    def _resolve_conflict(
+        self,
+        data: SessionData,
+        loaded: bytes,
+        current: bytes,
+        on_conflict: ConflictHandler,
+    ) -> SessionData | None:
+        """Rebase *data* of a session loaded as *loaded* over *current*.
+
+        Return the data to store instead of *current*, or ``None`` to keep
+        *current*, e.g. if a concurrent request invalidated the session.
+        """
+        theirs = self._decode_session_data(current)
+        if theirs is None:
+            return data
+        if "session" not in theirs:
+            return None
+        base = self._decode_session_data(loaded) or {}
+        merged = on_conflict(
+            base.get("session", {}), data.get("session", {}), theirs["session"]
+        )
+        if merged is None:
+            return None
+        return {"created": data.get("created", 0), "session": dict(merged)}
+
+    def _decode_session_data(
+        self, data: bytes, request: web.Request | None = None
+    ) -> SessionData | None:
+        try:
+            if is_compressed(data):
+                with phase(request, "decompress"):
+                    data = decompress_payload(data, self._compressor)
+            with phase(request, "decode"):
+                return cast(SessionData, self._codec.decode(data))
+        except ValueError:
+            # Includes DecompressionError.
+            if self._observer is not None:
+                self._observer.on_decode_error(self)
+            return None
+
     async def new_session(self) -> Session:
         return Session(None, data=None, new=True, max_age=self.max_age)
 
@@ -265,6 +575,38 @@ class AbstractStorage(metaclass=abc.ABCMeta):
     ) -> None:
         pass
 
+    async def save_session_delta(
+        self,
+        request: web.Request,
+        response: web.StreamResponse,
+        session: Session,
+        delta: SessionDelta,
+    ) -> None:
+        """Store only the keys changed since the session was loaded.
+
+        Storages able to apply partial updates override this method,
+        by default the whole session is saved.
+        """
+        await self.save_session(request, response, session)
+
+    def prepare_save(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> Awaitable[object] | None:
+        """Save the session cookie, return the pending backend write.
+
+        Used for deferred saving, storages which can't split saving
+        return ``None`` and are saved with :meth:`save_session` instead.
+        """
+        return None
+
+    async def refresh_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        """Extend the lifetime of a session which doesn't need saving.
+
+        Called for sessions marked by storages supporting sliding expiry.
+        """
+
     def load_cookie(self, request: web.Request) -> str | None:
         return request.cookies.get(self._cookie_name)
 
@@ -305,6 +647,9 @@ class SimpleCookieStorage(AbstractStorage):
         samesite: str | None = None,
         encoder: Callable[[object], str] = json.dumps,
         decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        codec: Codec | None = None,
     ) -> None:
         super().__init__(
             cookie_name=cookie_name,
@@ -316,18 +661,37 @@ class SimpleCookieStorage(AbstractStorage):
             samesite=samesite,
             encoder=encoder,
             decoder=decoder,
+            skip_unchanged=skip_unchanged,
+            observer=observer,
+            codec=codec,
         )
+        # Cookies hold text, binary payloads couldn't be saved.
+        if not isinstance(self._codec, TextCodec):
+            raise ValueError("SimpleCookieStorage requires a TextCodec")
+        self._text_codec = self._codec
 
     async def load_session(self, request: web.Request) -> Session:
-        cookie = self.load_cookie(request)
+        with phase(request, "cookie"):
+            cookie = self.load_cookie(request)
         if cookie is None:
             return Session(None, data=None, new=True, max_age=self.max_age)
 
-        data = self._decoder(cookie)
-        return Session(None, data=data, new=False, max_age=self.max_age)
+        if self._observer is not None:
+            self._observer.on_payload(self, "load", len(cookie))
+        with phase(request, "decode"):
+            data = self._text_codec.decode_text(cookie)
+        session = Session(None, data=data, new=False, max_age=self.max_age)
+        if self._skip_unchanged:
+            session._loaded_payload = cookie.encode("utf-8")
+        return session
 
     async def save_session(
         self, request: web.Request, response: web.StreamResponse, session: Session
     ) -> None:
-        cookie_data = self._encoder(self._get_session_data(session))
-        self.save_cookie(response, cookie_data, max_age=session.max_age)
+        with phase(request, "encode"):
+            data = self._get_session_data(session)
+            cookie_data = self._text_codec.encode_text(data)
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", len(cookie_data))
+        with phase(request, "set_cookie"):
+            self.save_cookie(response, cookie_data, max_age=session.max_age)
@@ -0,0 +1,99 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from functools import partial
+from typing import Generic, TypeVar
+
+_T = TypeVar("_T")
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class WriteBatcher(Generic[_T]):
+    """Coalesce writes submitted by concurrent requests.
+
+    Items are collected for *max_delay* seconds, or until *max_size*
+    items are pending, and handed to *flush* at once. The future
+    returned by :meth:`submit` resolves when its batch is flushed.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[_T]], Awaitable[None]],
+        *,
+        max_delay: float = 0.001,
+        max_size: int = 100,
+    ) -> None:
+        if max_delay < 0:
+            raise ValueError("max_delay should be non-negative")
+        if max_size < 1:
+            raise ValueError("max_size should be positive")
+        self._flush = flush
+        self._max_delay = max_delay
+        self._max_size = max_size
+        self._pending: list[tuple[_T, asyncio.Future[None]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def submit(self, item: _T) -> "asyncio.Future[None]":
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self._max_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush_pending)
+        return fut
+
+    def _flush_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            # Keep a reference until the batch is written.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[_T, "asyncio.Future[None]"]]) -> None:
+        try:
+            await self._flush([item for item, _ in batch])
+        except asyncio.CancelledError:
+            for _, fut in batch:
+                fut.cancel()
+            raise
+        except Exception as exc:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+        else:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_result(None)
+
+
+class SingleFlight(Generic[_K, _V]):
+    """Share one in-flight call between concurrent callers with the same key.
+
+    The call runs in a task shielded from cancellation of any single
+    caller, callers arriving after it completes start a new call.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[_K, asyncio.Task[_V]] = {}
+
+    async def do(self, key: _K, func: Callable[[], Awaitable[_V]]) -> _V:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(task)
+
+    def forget(self, key: _K) -> None:
+        """Make callers arriving later start a new call, e.g. after a write."""
+        self._calls.pop(key, None)
+
+    def _done(self, key: _K, task: "asyncio.Task[_V]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
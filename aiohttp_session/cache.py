@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+
+class SessionCache:
+    """In-process LRU cache of stored session payloads.
+
+    Server-side storages keep the encoded payload of loaded and saved
+    sessions here and skip the backend round trip on hits. Entries live
+    for at most *ttl* seconds, and never longer than the session
+    *max_age*. Every request decodes its own copy of the payload.
+    """
+
+    def __init__(self, *, max_entries: int = 10000, ttl: float = 60) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries should be positive")
+        if ttl <= 0:
+            raise ValueError("ttl should be positive")
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: bytes, max_age: int | None = None) -> None:
+        ttl = self._ttl if max_age is None else min(self._ttl, max_age)
+        self._entries[key] = (payload, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,127 @@
+import abc
+import json
+from collections.abc import Callable, Mapping
+from typing import Any
+
+
+class Codec(metaclass=abc.ABCMeta):
+    """Serializer of session data to and from :class:`bytes`.
+
+    Payloads must not start with the ``0xff`` or ``0xfe`` bytes, which
+    flag compressed and tagged payloads.
+    """
+
+    @abc.abstractmethod
+    def encode(self, data: object) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def decode(self, payload: bytes) -> Any:
+        pass
+
+
+class TextCodec(Codec):
+    """Codec of :class:`str` *encoder* and *decoder* callables, UTF-8 encoded."""
+
+    def __init__(
+        self,
+        encoder: Callable[[object], str] = json.dumps,
+        decoder: Callable[[str], Any] = json.loads,
+    ) -> None:
+        self._encoder = encoder
+        self._decoder = decoder
+
+    def encode(self, data: object) -> bytes:
+        return self._encoder(data).encode("utf-8")
+
+    def decode(self, payload: bytes) -> Any:
+        return self._decoder(payload.decode("utf-8"))
+
+    def encode_text(self, data: object) -> str:
+        return self._encoder(data)
+
+    def decode_text(self, text: str) -> Any:
+        return self._decoder(text)
+
+
+class OrjsonCodec(Codec):
+    """JSON codec of the orjson package, compatible with :class:`TextCodec`."""
+
+    def __init__(self) -> None:
+        try:
+            import orjson
+        except ImportError:  # pragma: no cover
+            raise RuntimeError("Please install orjson") from None
+        self._orjson = orjson
+
+    def encode(self, data: object) -> bytes:
+        return bytes(self._orjson.dumps(data))
+
+    def decode(self, payload: bytes) -> Any:
+        return self._orjson.loads(payload)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack codec, requires the msgpack package."""
+
+    def __init__(self) -> None:
+        try:
+            import msgpack
+        except ImportError:  # pragma: no cover
+            raise RuntimeError("Please install msgpack") from None
+        self._msgpack = msgpack
+
+    def encode(self, data: object) -> bytes:
+        return bytes(self._msgpack.packb(data))
+
+    def decode(self, payload: bytes) -> Any:
+        return self._msgpack.unpackb(payload)
+
+
+# First byte of tagged payloads, invalid in UTF-8 like the compression flag.
+TAGGED = b"\xfe"
+
+
+class CodecRegistry(Codec):
+    """Codec tagging payloads with the codec which encoded them.
+
+    *codecs* maps tags, from 0 to 255, to codecs. Payloads are encoded
+    with the *preferred* codec, the one with the highest tag by default,
+    and decoded with the codec of their tag. Untagged payloads, saved
+    before the registry was configured, are decoded with *untagged*.
+    """
+
+    def __init__(
+        self,
+        codecs: Mapping[int, Codec],
+        *,
+        preferred: int | None = None,
+        untagged: Codec | None = None,
+    ) -> None:
+        if not codecs:
+            raise ValueError("At least one codec is required")
+        if any(not 0 <= tag <= 255 for tag in codecs):
+            raise ValueError("Codec tags should be in [0, 255] range")
+        if preferred is None:
+            preferred = max(codecs)
+        elif preferred not in codecs:
+            raise ValueError(f"Unknown codec tag {preferred}")
+        self._codecs = dict(codecs)
+        self._preferred = preferred
+        self._prefix = TAGGED + bytes((preferred,))
+        self._untagged = untagged if untagged is not None else TextCodec()
+
+    @property
+    def preferred(self) -> int:
+        return self._preferred
+
+    def encode(self, data: object) -> bytes:
+        return self._prefix + self._codecs[self._preferred].encode(data)
+
+    def decode(self, payload: bytes) -> Any:
+        if payload[:1] != TAGGED:
+            return self._untagged.decode(payload)
+        codec = self._codecs.get(payload[1] if len(payload) > 1 else -1)
+        if codec is None:
+            raise ValueError("Unknown codec tag")
+        return codec.decode(payload[2:])
@@ -0,0 +1,207 @@
+import abc
+import zlib
+from collections.abc import Iterable, Mapping
+
+# Encoders produce UTF-8 text, which never starts with this byte, so
+# payloads stored before compression was enabled still load.
+MAGIC = b"\xff"
+
+
+class DecompressionError(ValueError):
+    """A compressed payload can't be decompressed."""
+
+
+class Compressor(metaclass=abc.ABCMeta):
+    """Compression algorithm of session payloads.
+
+    Compressed payloads start with :data:`MAGIC` and the *format_id* of
+    the compressor, which has to be unique per format.
+    """
+
+    format_id: int
+
+    @abc.abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        pass
+
+
+class ZlibCompressor(Compressor):
+    format_id = 1
+
+    def __init__(self, level: int = 6) -> None:
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            return zlib.decompress(data)
+        except zlib.error as exc:
+            raise DecompressionError(str(exc)) from exc
+
+
+class ZstdCompressor(Compressor):
+    """Zstandard compression, requires the zstandard package."""
+
+    format_id = 2
+
+    def __init__(self, level: int = 3) -> None:
+        try:
+            import zstandard
+        except ImportError:  # pragma: no cover
+            raise RuntimeError("Please install zstandard") from None
+        self._zstd = zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.compress(data))
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            return bytes(self._decompressor.decompress(data))
+        except self._zstd.ZstdError as exc:
+            raise DecompressionError(str(exc)) from exc
+
+
+class BrotliCompressor(Compressor):
+    """Brotli compression, requires the brotli package."""
+
+    format_id = 3
+
+    def __init__(self, quality: int = 5) -> None:
+        try:
+            import brotli
+        except ImportError:  # pragma: no cover
+            raise RuntimeError("Please install brotli") from None
+        self._brotli = brotli
+        self._quality = quality
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._brotli.compress(data, quality=self._quality))
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            return bytes(self._brotli.decompress(data))
+        except self._brotli.error as exc:
+            raise DecompressionError(str(exc)) from exc
+
+
+class ZstdDictCompressor(Compressor):
+    """Zstandard compression with pre-trained dictionaries.
+
+    *dictionaries* maps versions, from 0 to 255, to dictionaries made by
+    :func:`train_dictionary`. Payloads are compressed with the *version*
+    dictionary, the latest one by default, and carry its version so
+    payloads of older dictionaries still load while they are kept.
+    """
+
+    format_id = 4
+
+    def __init__(
+        self,
+        dictionaries: Mapping[int, bytes],
+        *,
+        version: int | None = None,
+        level: int = 3,
+    ) -> None:
+        try:
+            import zstandard
+        except ImportError:  # pragma: no cover
+            raise RuntimeError("Please install zstandard") from None
+        if not dictionaries:
+            raise ValueError("At least one dictionary is required")
+        if any(not 0 <= v <= 255 for v in dictionaries):
+            raise ValueError("Dictionary versions should be in [0, 255] range")
+        if version is None:
+            version = max(dictionaries)
+        elif version not in dictionaries:
+            raise ValueError(f"Unknown dictionary version {version}")
+        self._zstd = zstandard
+        self._version = version
+        dicts = {v: zstandard.ZstdCompressionDict(d) for v, d in dictionaries.items()}
+        # The version byte identifies the dictionary, skip zstd's own id.
+        self._compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=dicts[version], write_dict_id=False
+        )
+        self._decompressors = {
+            v: zstandard.ZstdDecompressor(dict_data=d) for v, d in dicts.items()
+        }
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes((self._version,)) + bytes(self._compressor.compress(data))
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = self._decompressors.get(data[0] if data else -1)
+        if decompressor is None:
+            raise DecompressionError("Unknown compression dictionary")
+        try:
+            return bytes(decompressor.decompress(data[1:]))
+        except self._zstd.ZstdError as exc:
+            raise DecompressionError(str(exc)) from exc
+
+
+def train_dictionary(samples: Iterable[bytes], *, size: int = 16384) -> bytes:
+    """Train a dictionary of at most *size* bytes for :class:`ZstdDictCompressor`.
+
+    *samples* are encoded sessions, e.g. collected with
+    :meth:`~aiohttp_session.redis_storage.RedisStorage.sample_payloads`.
+    Training needs at least a few hundred of them.
+    """
+    try:
+        import zstandard
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("Please install zstandard") from None
+    return bytes(zstandard.train_dictionary(size, list(samples)).as_bytes())
+
+
+# Payloads of ZstdDictCompressor need its dictionaries, it isn't listed.
+_FORMATS: dict[int, type[Compressor]] = {
+    cls.format_id: cls for cls in (ZlibCompressor, ZstdCompressor, BrotliCompressor)
+}
+# Default instances decompressing formats other than the configured one.
+_DEFAULTS: dict[int, Compressor] = {}
+
+
+def is_compressed(payload: bytes) -> bool:
+    return payload[:1] == MAGIC
+
+
+def compress_payload(payload: bytes, compressor: Compressor) -> bytes:
+    """Compress *payload*, unless it doesn't get smaller."""
+    compressed = compressor.compress(payload)
+    if len(compressed) + 2 >= len(payload):
+        return payload
+    return MAGIC + bytes((compressor.format_id,)) + compressed
+
+
+def decompress_payload(payload: bytes, compressor: Compressor | None = None) -> bytes:
+    """Decompress *payload* if it is compressed.
+
+    Payloads of another format than the one of *compressor* are
+    decompressed with a default instance of the built-in compressor
+    of that format.
+    """
+    if not is_compressed(payload):
+        return payload
+    format_id = payload[1] if len(payload) > 1 else -1
+    if compressor is None or compressor.format_id != format_id:
+        compressor = _DEFAULTS.get(format_id)
+        if compressor is None:
+            cls = _FORMATS.get(format_id)
+            if cls is None:
+                raise DecompressionError(f"Unknown compression format {format_id}")
+            try:
+                compressor = _DEFAULTS[format_id] = cls()
+            except RuntimeError as exc:
+                raise DecompressionError(str(exc)) from exc
+    return compressor.decompress(payload[2:])
@@ -0,0 +1,30 @@
+from collections.abc import Callable, Mapping
+from typing import Any
+
+# (base, ours, theirs) -> mapping to store, or None to keep theirs.
+ConflictHandler = Callable[
+    [Mapping[str, Any], Mapping[str, Any], Mapping[str, Any]],
+    Mapping[str, Any] | None,
+]
+
+# Compare-and-set attempts before giving up on a contended session.
+CAS_RETRIES = 10
+
+
+def merge_changes(
+    base: Mapping[str, Any], ours: Mapping[str, Any], theirs: Mapping[str, Any]
+) -> dict[str, Any]:
+    """Three-way merge of session mappings.
+
+    *base* is the session as loaded by the request, *ours* the session
+    the request wants to save and *theirs* the one saved meanwhile by a
+    concurrent request. Keys set or deleted by the request are applied
+    over *theirs*, when both changed a key the request wins.
+    """
+    merged = dict(theirs)
+    for key in base.keys() - ours.keys():
+        merged.pop(key, None)
+    for key, value in ours.items():
+        if key not in base or base[key] != value:
+            merged[key] = value
+    return merged
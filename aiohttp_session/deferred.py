@@ -0,0 +1,87 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable
+
+from aiohttp import web
+
+from .log import log
+
+
+class DeferredWriter:
+    """Background writer for session saves.
+
+    Backend writes are queued and awaited by worker tasks after the
+    response is sent. Writes of the same key go to the same worker, so
+    they are applied in order. When a worker's queue is full the request
+    waits for room, when the writer isn't running writes are awaited
+    inline by the request.
+    """
+
+    def __init__(self, *, max_pending: int = 1000, workers: int = 4) -> None:
+        if max_pending < 1:
+            raise ValueError("max_pending should be positive")
+        if workers < 1:
+            raise ValueError("workers should be positive")
+        self._max_pending = max_pending
+        self._workers_count = workers
+        self._queues: list[asyncio.Queue[Awaitable[object]]] | None = None
+        self._workers: list[asyncio.Task[None]] = []
+        self._next = 0
+
+    @property
+    def pending(self) -> int:
+        if self._queues is None:
+            return 0
+        return sum(queue.qsize() for queue in self._queues)
+
+    def start(self) -> None:
+        if self._queues is not None:
+            raise RuntimeError("Writer is already started")
+        # max_pending is shared by the workers' queues.
+        size = -(-self._max_pending // self._workers_count)
+        self._queues = [asyncio.Queue(size) for _ in range(self._workers_count)]
+        self._workers = [
+            asyncio.create_task(self._work(queue)) for queue in self._queues
+        ]
+
+    async def close(self) -> None:
+        """Wait for queued writes and stop workers."""
+        queues = self._queues
+        if queues is None:
+            return
+        self._queues = None
+        await asyncio.gather(*(queue.join() for queue in queues))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        """Run the writer for the application lifetime."""
+        self.start()
+        yield
+        await self.close()
+
+    async def submit(self, write: Awaitable[object], key: object = None) -> None:
+        """Queue *write* of the session stored under *key*."""
+        queues = self._queues
+        if queues is None:
+            await write
+            return
+        if key is None:
+            index = self._next
+            self._next = (index + 1) % len(queues)
+        else:
+            index = hash(key) % len(queues)
+        # Waiting for room rather than writing inline keeps the order
+        # of writes already queued for the key.
+        await queues[index].put(write)
+
+    async def _work(self, queue: "asyncio.Queue[Awaitable[object]]") -> None:
+        while True:
+            write = await queue.get()
+            try:
+                await write
+            except Exception:
+                log.exception("Deferred session save failed")
+            finally:
+                queue.task_done()
@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+from collections.abc import Callable, Hashable
+from typing import Generic, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+
+
+class TimerWheel(Generic[_K]):
+    """Hierarchical timer wheel scheduling expiry of keys.
+
+    Time is split in ticks of *resolution* seconds. Level ``n`` of the
+    wheel has *slots* slots of ``slots ** n`` ticks each, a key is put in
+    the slot of the lowest level covering its deadline and moved down as
+    the wheel turns. Scheduling, cancelling and expiring a key all take
+    amortized constant time, however many keys are scheduled.
+
+    Keys expire no earlier than their deadline and at most one tick late.
+    Deadlines beyond ``slots ** levels`` ticks are rescheduled on every
+    turn of the top level.
+    """
+
+    def __init__(
+        self, *, resolution: float = 1, slots: int = 64, levels: int = 4
+    ) -> None:
+        if resolution <= 0:
+            raise ValueError("resolution should be positive")
+        if slots < 2 or levels < 1:
+            raise ValueError("at least 2 slots and 1 level are required")
+        self._resolution = resolution
+        self._slots = slots
+        # Ticks covered by one slot of each level, and by the whole wheel.
+        self._spans = [slots**level for level in range(levels)]
+        self._horizon = slots**levels
+        self._wheels: list[list[dict[_K, int]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # Key -> slot it is currently in, for constant time cancelling.
+        self._slot_of: dict[_K, dict[_K, int]] = {}
+        # The last tick which has been processed.
+        self._tick = math.floor(time.monotonic() / resolution)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._slot_of
+
+    @property
+    def resolution(self) -> float:
+        return self._resolution
+
+    def schedule(self, key: _K, deadline: float) -> None:
+        """Expire *key* at *deadline*, a :func:`time.monotonic` timestamp.
+
+        A key scheduled before is rescheduled.
+        """
+        self.cancel(key)
+        tick = math.ceil(deadline / self._resolution)
+        self._place(key, max(tick, self._tick + 1))
+
+    def cancel(self, key: _K) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def _place(self, key: _K, tick: int) -> None:
+        delta = min(tick - self._tick, self._horizon - 1)
+        level = len(self._spans) - 1
+        while level and delta < self._spans[level]:
+            level -= 1
+        position = tick if delta == tick - self._tick else self._tick + delta
+        slot = self._wheels[level][position // self._spans[level] % self._slots]
+        slot[key] = tick
+        self._slot_of[key] = slot
+
+    def advance(self, now: float | None = None) -> list[_K]:
+        """Turn the wheel up to *now*, return the keys which expired."""
+        if now is None:
+            now = time.monotonic()
+        target = math.floor(now / self._resolution)
+        expired: list[_K] = []
+        slot_of = self._slot_of
+        while self._tick < target:
+            self._tick += 1
+            tick = self._tick
+            # Move keys of higher level slots starting at this tick down,
+            # the top level first so they can cascade further.
+            for level in range(len(self._spans) - 1, 0, -1):
+                span = self._spans[level]
+                if tick % span:
+                    continue
+                slot = self._wheels[level][tick // span % self._slots]
+                items = list(slot.items())
+                slot.clear()
+                for key, deadline in items:
+                    del slot_of[key]
+                    if deadline <= tick:
+                        expired.append(key)
+                    else:
+                        self._place(key, deadline)
+            slot = self._wheels[0][tick % self._slots]
+            if slot:
+                items = list(slot.items())
+                slot.clear()
+                for key, deadline in items:
+                    del slot_of[key]
+                    if deadline <= tick:
+                        expired.append(key)
+                    else:
+                        # Beyond the horizon of a single level wheel.
+                        self._place(key, deadline)
+        return expired
+
+    async def run(self, on_expired: Callable[[list[_K]], None]) -> None:
+        """Turn the wheel every tick, passing expired keys to *on_expired*."""
+        while True:
+            await asyncio.sleep(self._resolution)
+            expired = self.advance()
+            if expired:
+                on_expired(expired)
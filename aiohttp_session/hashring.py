@@ -0,0 +1,70 @@
+import bisect
+import hashlib
+from collections.abc import Mapping
+from typing import Generic, TypeVar
+
+_N = TypeVar("_N")
+
+
+def _hash(value: str) -> int:
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HashRing(Generic[_N]):
+    """Consistent-hash ring mapping keys to named nodes.
+
+    Every node is placed on the ring *vnodes* times, a key belongs to the
+    first node point following the key's hash. Adding a node to a ring of
+    ``N`` nodes moves about ``1 / (N + 1)`` of the keys, all of them to
+    the new node. Placement depends on node names only, so every process
+    using the same names routes keys the same way.
+    """
+
+    def __init__(self, nodes: Mapping[str, _N], *, vnodes: int = 160) -> None:
+        if vnodes < 1:
+            raise ValueError("vnodes should be positive")
+        self._vnodes = vnodes
+        self._nodes: dict[str, _N] = {}
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        for name, node in nodes.items():
+            self._nodes[name] = node
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def nodes(self) -> Mapping[str, _N]:
+        return self._nodes
+
+    def _rebuild(self) -> None:
+        ring = sorted(
+            (_hash(f"{name}-{n}"), name)
+            for name in self._nodes
+            for n in range(self._vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [name for _, name in ring]
+
+    def add(self, name: str, node: _N) -> None:
+        if name in self._nodes:
+            raise ValueError(f"Node {name!r} is already in the ring")
+        self._nodes[name] = node
+        self._rebuild()
+
+    def remove(self, name: str) -> None:
+        del self._nodes[name]
+        self._rebuild()
+
+    def get_name(self, key: str) -> str:
+        """Name of the node *key* belongs to."""
+        if not self._points:
+            raise LookupError("The ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key))
+        return self._owners[index % len(self._owners)]
+
+    def get(self, key: str) -> _N:
+        """Node *key* belongs to."""
+        return self._nodes[self.get_name(key)]
@@ -0,0 +1,90 @@
+from aiohttp import web
+
+from . import AbstractStorage, Session
+from .metrics import SessionObserver
+from .timing import phase
+
+
+class HybridStorage(AbstractStorage):
+    """Storage keeping small sessions in cookies and large ones on a server.
+
+    Sessions are saved with *cookie_storage* while its cookie value fits
+    in *threshold* bytes, larger ones are moved to *server_storage* and
+    only its reference cookie is sent.
+    """
+
+    def __init__(
+        self,
+        cookie_storage: AbstractStorage,
+        server_storage: AbstractStorage,
+        *,
+        threshold: int = 3072,
+        observer: SessionObserver | None = None,
+    ) -> None:
+        super().__init__(
+            cookie_name=cookie_storage.cookie_name,
+            max_age=cookie_storage.max_age,
+            observer=observer,
+        )
+        if cookie_storage.cookie_name == server_storage.cookie_name:
+            raise ValueError("Storages should use different cookie names")
+        if threshold < 1:
+            raise ValueError("threshold should be positive")
+        self._cookie_storage = cookie_storage
+        self._server_storage = server_storage
+        self._threshold = threshold
+
+    @property
+    def cookie_storage(self) -> AbstractStorage:
+        return self._cookie_storage
+
+    @property
+    def server_storage(self) -> AbstractStorage:
+        return self._server_storage
+
+    def load_cookie(self, request: web.Request) -> str | None:
+        cookie = self._server_storage.load_cookie(request)
+        if cookie is None:
+            cookie = self._cookie_storage.load_cookie(request)
+        return cookie
+
+    async def load_session(self, request: web.Request) -> Session:
+        if self._server_storage.load_cookie(request) is not None:
+            session = await self._server_storage.load_session(request)
+            if not session.new:
+                return session
+        return await self._cookie_storage.load_session(request)
+
+    async def save_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        await self._cookie_storage.save_session(request, response, session)
+        morsel = response.cookies.get(self._cookie_storage.cookie_name)
+        if morsel is None or len(morsel.coded_value) <= self._threshold:
+            if self._server_storage.load_cookie(request) is not None:
+                await self._drop_server_session(request, response, session)
+            return
+        # Too large for a cookie, keep only the reference to the server copy.
+        with phase(request, "spill"):
+            await self._server_storage.save_session(request, response, session)
+        if self._cookie_storage.load_cookie(request) is not None:
+            self._cookie_storage.save_cookie(response, "", max_age=session.max_age)
+        else:
+            del response.cookies[self._cookie_storage.cookie_name]
+
+    async def _drop_server_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        if session.identity is None:
+            self._server_storage.save_cookie(response, "", max_age=session.max_age)
+            return
+        # Saving an empty session deletes the reference cookie and
+        # overwrites the stored data.
+        empty = Session(session.identity, data=None, new=False, max_age=session.max_age)
+        await self._server_storage.save_session(request, response, empty)
+
+    async def refresh_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        # Only server storages mark sessions to refresh.
+        await self._server_storage.refresh_session(request, response, session)
@@ -1,13 +1,25 @@
 import json
 import uuid
-from collections.abc import Callable
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import partial
 from time import time
-from typing import Any
+from typing import Any, cast
 
 import aiomcache
 from aiohttp import web
 
-from . import AbstractStorage, Session
+from . import AbstractStorage, Session, SessionData
+from .batching import SingleFlight
+from .cache import SessionCache
+from .codecs import Codec
+from .compression import Compressor
+from .conflict import CAS_RETRIES, ConflictHandler, merge_changes
+from .metrics import SessionObserver
+from .timing import phase
+
+# Max number of session keys tracked for sliding expiry throttling.
+REFRESH_HISTORY_SIZE = 65536
 
 
 class MemcachedStorage(AbstractStorage):
@@ -26,7 +38,18 @@ class MemcachedStorage(AbstractStorage):
         samesite: str | None = None,
         key_factory: Callable[[], str] = lambda: uuid.uuid4().hex,
         encoder: Callable[[object], str] = json.dumps,
-        decoder: Callable[[str], Any] = json.loads
+        decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        lazy_decode: bool = False,
+        sliding_expiry: float | None = None,
+        coalesce_loads: bool = False,
+        cache: SessionCache | None = None,
+        compare_and_set: bool = False,
+        on_conflict: ConflictHandler = merge_changes,
+        compressor: Compressor | None = None,
+        compress_threshold: int = 256,
+        codec: Codec | None = None,
     ) -> None:
         super().__init__(
             cookie_name=cookie_name,
@@ -38,53 +61,204 @@ class MemcachedStorage(AbstractStorage):
             samesite=samesite,
             encoder=encoder,
             decoder=decoder,
+            skip_unchanged=skip_unchanged,
+            observer=observer,
+            compressor=compressor,
+            compress_threshold=compress_threshold,
+            codec=codec,
         )
         self._key_factory = key_factory
+        self._lazy_decode = lazy_decode
+        if sliding_expiry is not None:
+            if max_age is None:
+                raise ValueError("sliding_expiry requires max_age")
+            if not 0 < sliding_expiry <= 1:
+                raise ValueError("sliding_expiry should be in (0, 1] range")
+        self._sliding_expiry = sliding_expiry
+        # Memcached doesn't report remaining TTL, remember when keys were
+        # last written or touched by this process instead.
+        self._refreshed: OrderedDict[str, int] = OrderedDict()
+        self._loads: SingleFlight[bytes, tuple[bytes | None, int | None]] | None = (
+            None
+        )
+        if coalesce_loads:
+            self._loads = SingleFlight()
+        if cache is not None and sliding_expiry is not None:
+            # Cache hits would postpone refreshes past the backend expiry.
+            raise ValueError("cache can't be combined with sliding_expiry")
+        self._cache = cache
+        self._compare_and_set = compare_and_set
+        self._on_conflict = on_conflict
         self.conn = memcached_conn
 
     async def load_session(self, request: web.Request) -> Session:
-        cookie = self.load_cookie(request)
+        with phase(request, "cookie"):
+            cookie = self.load_cookie(request)
         if cookie is None:
             return Session(None, data=None, new=True, max_age=self.max_age)
         else:
             key = str(cookie)
             stored_key = (self.cookie_name + "_" + key).encode("utf-8")
-            data_b = await self.conn.get(stored_key)
+            data_b = None
+            cas_token = None
+            if self._cache is not None:
+                data_b = self._cache.get(self.cookie_name + "_" + key)
+                if self._observer is not None:
+                    self._observer.on_cache(self, data_b is not None)
+            if data_b is None:
+                with phase(request, "fetch"):
+                    if self._loads is None:
+                        data_b, cas_token = await self._fetch(stored_key)
+                    else:
+                        # Concurrent requests of the same client share the
+                        # round trip, each of them decodes its own Session.
+                        data_b, cas_token = await self._loads.do(
+                            stored_key, partial(self._fetch, stored_key)
+                        )
+                if self._cache is not None and data_b is not None:
+                    self._cache.put(self.cookie_name + "_" + key, data_b, self.max_age)
             if data_b is None:
                 return Session(None, data=None, new=True, max_age=self.max_age)
-            data = data_b.decode("utf-8")
-            try:
-                sess_data = self._decoder(data)
-            except ValueError:
-                sess_data = None
-            return Session(key, data=sess_data, new=False, max_age=self.max_age)
+            if self._observer is not None:
+                self._observer.on_payload(self, "load", len(data_b))
+            session = Session(
+                key,
+                data=None,
+                new=False,
+                max_age=self.max_age,
+                loader=partial(self._decode_session_data, data_b, request),
+            )
+            if self._skip_unchanged or self._compare_and_set:
+                session._loaded_payload = data_b
+                session._cas_token = cas_token
+            if self._sliding_expiry is not None:
+                # The key is still stored, so it was written or touched
+                # within max_age; the backend expiry is authoritative.
+                now = int(time())
+                session._refreshed = now
+                refreshed = self._refreshed.get(key)
+                session._refresh_due = (
+                    refreshed is None
+                    or now - refreshed >= cast(int, self.max_age) * self._sliding_expiry
+                )
+            if not self._lazy_decode:
+                session._load_pending()
+            return session
 
-    async def save_session(
+    async def _fetch(self, stored_key: bytes) -> tuple[bytes | None, int | None]:
+        if self._compare_and_set:
+            return await self.conn.gets(stored_key)
+        return await self.conn.get(stored_key), None
+
+    async def refresh_session(
         self, request: web.Request, response: web.StreamResponse, session: Session
     ) -> None:
-        key = session.identity
-        if key is None:
-            key = self._key_factory()
-            self.save_cookie(response, key, max_age=session.max_age)
-        else:
-            if session.empty:
-                self.save_cookie(response, "", max_age=session.max_age)
-            else:
-                key = str(key)
-                self.save_cookie(response, key, max_age=session.max_age)
+        key = str(session.identity)
+        self.save_cookie(response, key, max_age=session.max_age)
+        stored_key = (self.cookie_name + "_" + key).encode("utf-8")
+        expire = self._expire(session.max_age or self.max_age)
+        await self.conn.touch(stored_key, exptime=expire)
+        self._remember_refresh(key)
 
-        data = self._encoder(self._get_session_data(session))
-        max_age = session.max_age
+    def _remember_refresh(self, key: str) -> None:
+        if self._sliding_expiry is None:
+            return
+        self._refreshed[key] = int(time())
+        self._refreshed.move_to_end(key)
+        if len(self._refreshed) > REFRESH_HISTORY_SIZE:
+            self._refreshed.popitem(last=False)
+
+    def _expire(self, max_age: int | None) -> int:
         # https://github.com/memcached/memcached/wiki/Programming#expiration
         # "Expiration times can be set from 0, meaning "never expire", to
         # 30 days. Any time higher than 30 days is interpreted as a Unix
         # timestamp date. If you want to expire an object on January 1st of
         # next year, this is how you do that."
         if max_age is None:
-            expire = 0
+            return 0
         elif max_age > 30 * 24 * 60 * 60:
-            expire = int(time()) + max_age
+            return int(time()) + max_age
         else:
-            expire = max_age
+            return max_age
+
+    async def save_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        write = self.prepare_save(request, response, session)
+        with phase(request, "store"):
+            await write
+
+    def prepare_save(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> Awaitable[object]:
+        key = session.identity
+        with phase(request, "set_cookie"):
+            if key is None:
+                key = self._key_factory()
+                # Deferred writes of the session are routed by identity.
+                session.set_new_identity(key)
+                self.save_cookie(response, key, max_age=session.max_age)
+            else:
+                if session.empty:
+                    self.save_cookie(response, "", max_age=session.max_age)
+                else:
+                    key = str(key)
+                    self.save_cookie(response, key, max_age=session.max_age)
+
+        data = self._get_session_data(session)
+        expire = self._expire(session.max_age)
         stored_key = (self.cookie_name + "_" + key).encode("utf-8")
-        await self.conn.set(stored_key, data.encode("utf-8"), exptime=expire)
+        self._remember_refresh(key)
+        if self._loads is not None:
+            self._loads.forget(stored_key)
+        loaded = session._loaded_payload
+        if self._compare_and_set and loaded is not None and not session.empty:
+            return self._cas_write(
+                stored_key, loaded, session._cas_token, data, expire, session.max_age
+            )
+        value = self._encode_payload(data, request)
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", len(value))
+        if self._cache is not None:
+            self._cache.put(self.cookie_name + "_" + key, value, session.max_age)
+        return cast(
+            Awaitable[object], self.conn.set(stored_key, value, exptime=expire)
+        )
+
+    async def _cas_write(
+        self,
+        stored_key: bytes,
+        loaded: bytes,
+        cas_token: int | None,
+        data: SessionData,
+        expire: int,
+        max_age: int | None,
+    ) -> None:
+        value = self._encode_payload(data)
+        for _ in range(CAS_RETRIES):
+            if cas_token is None:
+                current, cas_token = await self.conn.gets(stored_key)
+                if current is None or cas_token is None:
+                    # Expired meanwhile, add fails if it was just recreated.
+                    if await self.conn.add(stored_key, value, exptime=expire):
+                        break
+                    continue
+                to_store: SessionData | None = data
+                if current != loaded:
+                    to_store = self._resolve_conflict(
+                        data, loaded, current, self._on_conflict
+                    )
+                if to_store is None:
+                    if self._cache is not None:
+                        self._cache.invalidate(stored_key.decode("utf-8"))
+                    return
+                value = self._encode_payload(to_store)
+            if await self.conn.cas(stored_key, value, cas_token, exptime=expire):
+                break
+            cas_token = None
+        else:
+            raise RuntimeError(f"Session {stored_key!r} is modified concurrently")
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", len(value))
+        if self._cache is not None:
+            self._cache.put(stored_key.decode("utf-8"), value, max_age)
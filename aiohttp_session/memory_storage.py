@@ -0,0 +1,223 @@
+import asyncio
+import copy
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from aiohttp import web
+
+from . import AbstractStorage, Session, SessionDelta
+from .expiry import TimerWheel
+from .log import log
+from .metrics import SessionObserver
+from .timing import phase
+
+
+class _Entry:
+    __slots__ = ("data", "created", "expires", "size")
+
+    def __init__(
+        self, data: dict[str, Any], created: int, expires: float | None, size: int
+    ) -> None:
+        self.data = data
+        self.created = created
+        self.expires = expires
+        self.size = size
+
+
+def _sizeof(obj: object) -> int:
+    """Approximate memory taken by *obj* and the containers inside it."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _sizeof(key) + _sizeof(value)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _sizeof(item)
+    return size
+
+
+class InMemoryStorage(AbstractStorage):
+    """In-process storage keeping sessions in a bounded LRU table.
+
+    Session mappings are stored as they are, without encoding, and every
+    load gets a deep copy of them. Sessions are lost on restart and
+    aren't shared between processes. Expired sessions are dropped on
+    access, and by a timer wheel while :meth:`expiry_ctx` runs.
+    """
+
+    def __init__(
+        self,
+        *,
+        cookie_name: str = "AIOHTTP_SESSION",
+        domain: str | None = None,
+        max_age: int | None = None,
+        path: str = "/",
+        secure: bool | None = None,
+        httponly: bool = True,
+        samesite: str | None = None,
+        key_factory: Callable[[], str] = lambda: uuid.uuid4().hex,
+        observer: SessionObserver | None = None,
+        max_entries: int | None = 100000,
+        max_bytes: int | None = None,
+    ) -> None:
+        super().__init__(
+            cookie_name=cookie_name,
+            domain=domain,
+            max_age=max_age,
+            path=path,
+            secure=secure,
+            httponly=httponly,
+            samesite=samesite,
+            observer=observer,
+        )
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries should be positive")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes should be positive")
+        self._key_factory = key_factory
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._size = 0
+        self._wheel: TimerWheel[str] = TimerWheel()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Approximate number of bytes taken by the stored sessions."""
+        return self._size
+
+    def _get(self, key: str) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires is not None and entry.expires <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+            if entry.expires is not None:
+                self._wheel.cancel(key)
+
+    def _store(
+        self, key: str, data: dict[str, Any], created: int, max_age: int | None
+    ) -> None:
+        self._remove(key)
+        size = _sizeof(data)
+        if self._max_bytes is not None and size > self._max_bytes:
+            # Evicting every other session wouldn't make room for it.
+            log.warning(
+                "Session of %d bytes exceeds max_bytes, it is not stored", size
+            )
+            return
+        expires = None if max_age is None else time.monotonic() + max_age
+        entry = _Entry(data, created, expires, size)
+        self._entries[key] = entry
+        self._size += entry.size
+        if expires is not None:
+            self._wheel.schedule(key, expires)
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", entry.size)
+        self._evict()
+
+    def _evict(self) -> None:
+        # The least recently used sessions go first.
+        max_entries = self._max_entries
+        max_bytes = self._max_bytes
+        while (max_entries is not None and len(self._entries) > max_entries) or (
+            max_bytes is not None and self._size > max_bytes
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            if entry.expires is not None:
+                self._wheel.cancel(key)
+
+    def _expire(self, keys: list[str]) -> None:
+        now = time.monotonic()
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires is None:
+                continue
+            if entry.expires <= now:
+                self._remove(key)
+            else:
+                # Rounding of the deadline to ticks may be off by a hair.
+                self._wheel.schedule(key, entry.expires)
+
+    def expire(self) -> None:
+        """Drop the sessions which have expired since the last call."""
+        self._expire(self._wheel.advance())
+
+    async def expiry_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        """Drop expired sessions every second, for app.cleanup_ctx."""
+        task = asyncio.create_task(self._wheel.run(self._expire))
+        yield
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def load_session(self, request: web.Request) -> Session:
+        with phase(request, "cookie"):
+            cookie = self.load_cookie(request)
+        if cookie is None:
+            return Session(None, data=None, new=True, max_age=self.max_age)
+        entry = self._get(cookie)
+        if entry is None:
+            return Session(None, data=None, new=True, max_age=self.max_age)
+        if self._observer is not None:
+            self._observer.on_payload(self, "load", entry.size)
+        with phase(request, "copy"):
+            data = copy.deepcopy(entry.data)
+        return Session(
+            cookie,
+            data={"created": entry.created, "session": data},
+            new=False,
+            max_age=self.max_age,
+        )
+
+    async def save_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        key = session.identity
+        if session.empty:
+            with phase(request, "set_cookie"):
+                self.save_cookie(response, "", max_age=session.max_age)
+            if key is not None:
+                self._remove(str(key))
+            return
+        key = self._key_factory() if key is None else str(key)
+        with phase(request, "set_cookie"):
+            self.save_cookie(response, key, max_age=session.max_age)
+        self._store(key, dict(session._mapping), session.created, session.max_age)
+
+    async def save_session_delta(
+        self,
+        request: web.Request,
+        response: web.StreamResponse,
+        session: Session,
+        delta: SessionDelta,
+    ) -> None:
+        key = session.identity
+        entry = None if key is None or session.empty else self._get(str(key))
+        if entry is None:
+            await self.save_session(request, response, session)
+            return
+        # Apply the changes over the stored session, keeping the keys
+        # concurrent requests have set meanwhile.
+        data = dict(entry.data)
+        for name in delta["deleted"]:
+            data.pop(name, None)
+        data.update(delta["updated"])
+        with phase(request, "set_cookie"):
+            self.save_cookie(response, str(key), max_age=session.max_age)
+        self._store(str(key), data, session.created, session.max_age)
@@ -0,0 +1,196 @@
+import bisect
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+
+if TYPE_CHECKING:  # pragma: no cover
+    from . import AbstractStorage
+
+
+class SessionObserver:
+    """Receive measurements of session storage operations.
+
+    All methods are no-ops, subclasses override the ones they need.
+    *storage* is the reporting storage instance, durations are in
+    seconds and sizes in bytes of the encoded (or encrypted) payload.
+    """
+
+    def on_load(self, storage: "AbstractStorage", duration: float, new: bool) -> None:
+        """A session was loaded, *new* if no stored session was found."""
+
+    def on_save(self, storage: "AbstractStorage", duration: float) -> None:
+        """A changed session was saved (or queued for deferred saving)."""
+
+    def on_refresh(self, storage: "AbstractStorage", duration: float) -> None:
+        """The lifetime of an unchanged session was extended."""
+
+    def on_payload(self, storage: "AbstractStorage", operation: str, size: int) -> None:
+        """A payload of *size* bytes was read (``"load"``) or written (``"save"``)."""
+
+    def on_cache(self, storage: "AbstractStorage", hit: bool) -> None:
+        """A local cache lookup was served (*hit*) or went to the backend."""
+
+    def on_decode_error(self, storage: "AbstractStorage") -> None:
+        """A stored session couldn't be decrypted or decoded."""
+
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+SIZE_BUCKETS = (64, 256, 1024, 2048, 4096, 16384, 65536)
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        # The last count is the +Inf bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _labels(**labels: str) -> str:
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _le(bound: float) -> str:
+    return repr(float(bound))
+
+
+class PrometheusCollector(SessionObserver):
+    """Observer aggregating measurements in Prometheus metrics.
+
+    Storages are labelled by class name. :meth:`handler` serves the
+    text exposition format::
+
+        app.router.add_get("/metrics", collector.handler)
+    """
+
+    def __init__(
+        self,
+        *,
+        namespace: str = "aiohttp_session",
+        latency_buckets: Sequence[float] = LATENCY_BUCKETS,
+        size_buckets: Sequence[float] = SIZE_BUCKETS,
+    ) -> None:
+        self._namespace = namespace
+        self._latency_buckets = tuple(sorted(latency_buckets))
+        self._size_buckets = tuple(sorted(size_buckets))
+        self._latency: dict[tuple[str, str], _Histogram] = {}
+        self._size: dict[tuple[str, str], _Histogram] = {}
+        self._loads: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self._cache: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self._decode_errors: defaultdict[str, int] = defaultdict(int)
+
+    def _observe_latency(
+        self, storage: "AbstractStorage", operation: str, duration: float
+    ) -> None:
+        key = (type(storage).__name__, operation)
+        histogram = self._latency.get(key)
+        if histogram is None:
+            histogram = self._latency[key] = _Histogram(self._latency_buckets)
+        histogram.observe(duration)
+
+    def on_load(self, storage: "AbstractStorage", duration: float, new: bool) -> None:
+        self._observe_latency(storage, "load", duration)
+        self._loads[(type(storage).__name__, "true" if new else "false")] += 1
+
+    def on_save(self, storage: "AbstractStorage", duration: float) -> None:
+        self._observe_latency(storage, "save", duration)
+
+    def on_refresh(self, storage: "AbstractStorage", duration: float) -> None:
+        self._observe_latency(storage, "refresh", duration)
+
+    def on_payload(self, storage: "AbstractStorage", operation: str, size: int) -> None:
+        key = (type(storage).__name__, operation)
+        histogram = self._size.get(key)
+        if histogram is None:
+            histogram = self._size[key] = _Histogram(self._size_buckets)
+        histogram.observe(size)
+
+    def on_cache(self, storage: "AbstractStorage", hit: bool) -> None:
+        self._cache[(type(storage).__name__, "hit" if hit else "miss")] += 1
+
+    def on_decode_error(self, storage: "AbstractStorage") -> None:
+        self._decode_errors[type(storage).__name__] += 1
+
+    def _render_histograms(
+        self,
+        lines: list[str],
+        name: str,
+        help_text: str,
+        histograms: dict[tuple[str, str], _Histogram],
+    ) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (storage, operation), histogram in sorted(histograms.items()):
+            cumulative = 0
+            bounds = [_le(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                labels = _labels(storage=storage, operation=operation, le=bound)
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels(storage=storage, operation=operation)
+            lines.append(f"{name}_sum{labels} {histogram.sum!r}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text exposition format."""
+        ns = self._namespace
+        lines: list[str] = []
+        self._render_histograms(
+            lines,
+            f"{ns}_operation_duration_seconds",
+            "Duration of session storage operations.",
+            self._latency,
+        )
+        self._render_histograms(
+            lines,
+            f"{ns}_payload_size_bytes",
+            "Size of loaded and saved session payloads.",
+            self._size,
+        )
+        name = f"{ns}_loads_total"
+        lines.append(f"# HELP {name} Loaded sessions, new if none was stored.")
+        lines.append(f"# TYPE {name} counter")
+        for (storage, new), count in sorted(self._loads.items()):
+            lines.append(f"{name}{_labels(storage=storage, new=new)} {count}")
+        name = f"{ns}_cache_lookups_total"
+        lines.append(f"# HELP {name} Local session cache lookups.")
+        lines.append(f"# TYPE {name} counter")
+        for (storage, result), count in sorted(self._cache.items()):
+            lines.append(f"{name}{_labels(storage=storage, result=result)} {count}")
+        name = f"{ns}_decode_errors_total"
+        lines.append(f"# HELP {name} Stored sessions failing to decrypt or decode.")
+        lines.append(f"# TYPE {name} counter")
+        for storage, count in sorted(self._decode_errors.items()):
+            lines.append(f"{name}{_labels(storage=storage)} {count}")
+        return "\n".join(lines) + "\n"
+
+    async def handler(self, request: web.Request) -> web.Response:
+        """aiohttp handler serving :meth:`render` output."""
+        return web.Response(
+            body=self.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
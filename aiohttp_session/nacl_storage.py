@@ -10,7 +10,16 @@ from aiohttp import web
 from nacl.encoding import Base64Encoder
 
 from . import AbstractStorage, Session
+from .codecs import Codec
+from .compression import (
+    Compressor,
+    DecompressionError,
+    decompress_payload,
+    is_compressed,
+)
 from .log import log
+from .metrics import SessionObserver
+from .timing import phase
 
 
 class NaClCookieStorage(AbstractStorage):
@@ -28,7 +37,12 @@ class NaClCookieStorage(AbstractStorage):
         httponly: bool = True,
         samesite: str | None = None,
         encoder: Callable[[object], str] = json.dumps,
-        decoder: Callable[[str], Any] = json.loads
+        decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        compressor: Compressor | None = None,
+        compress_threshold: int = 256,
+        codec: Codec | None = None,
     ) -> None:
         super().__init__(
             cookie_name=cookie_name,
@@ -40,6 +54,11 @@ class NaClCookieStorage(AbstractStorage):
             samesite=samesite,
             encoder=encoder,
             decoder=decoder,
+            skip_unchanged=skip_unchanged,
+            observer=observer,
+            compressor=compressor,
+            compress_threshold=compress_threshold,
+            codec=codec,
         )
 
         self._secretbox = nacl.secret.SecretBox(secret_key)
@@ -48,18 +67,30 @@ class NaClCookieStorage(AbstractStorage):
         return Session(None, data=None, new=True, max_age=self.max_age)
 
     async def load_session(self, request: web.Request) -> Session:
-        cookie = self.load_cookie(request)
+        with phase(request, "cookie"):
+            cookie = self.load_cookie(request)
         if cookie is None:
             return self.empty_session()
         else:
+            if self._observer is not None:
+                self._observer.on_payload(self, "load", len(cookie))
             try:
-                data = self._decoder(
-                    self._secretbox.decrypt(
+                with phase(request, "decrypt"):
+                    payload = self._secretbox.decrypt(
                         cookie.encode("utf-8"), encoder=Base64Encoder
-                    ).decode("utf-8")
-                )
-                return Session(None, data=data, new=False, max_age=self.max_age)
-            except (binascii.Error, nacl.exceptions.CryptoError):
+                    )
+                if is_compressed(payload):
+                    with phase(request, "decompress"):
+                        payload = decompress_payload(payload, self._compressor)
+                with phase(request, "decode"):
+                    data = self._codec.decode(payload)
+                session = Session(None, data=data, new=False, max_age=self.max_age)
+                if self._skip_unchanged:
+                    session._loaded_payload = payload
+                return session
+            except (binascii.Error, nacl.exceptions.CryptoError, DecompressionError):
+                if self._observer is not None:
+                    self._observer.on_decode_error(self)
                 log.warning(
                     "Cannot decrypt cookie value, " "create a new fresh session"
                 )
@@ -71,12 +102,13 @@ class NaClCookieStorage(AbstractStorage):
         if session.empty:
             return self.save_cookie(response, "", max_age=session.max_age)
 
-        cookie_data = self._encoder(self._get_session_data(session)).encode("utf-8")
-        nonce = nacl.utils.random(nacl.secret.SecretBox.NONCE_SIZE)
-        self.save_cookie(
-            response,
-            self._secretbox.encrypt(cookie_data, nonce, encoder=Base64Encoder).decode(
-                "utf-8"
-            ),
-            max_age=session.max_age,
-        )
+        cookie_data = self._encode_payload(self._get_session_data(session), request)
+        with phase(request, "encrypt"):
+            nonce = nacl.utils.random(nacl.secret.SecretBox.NONCE_SIZE)
+            encrypted = self._secretbox.encrypt(
+                cookie_data, nonce, encoder=Base64Encoder
+            ).decode("utf-8")
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", len(encrypted))
+        with phase(request, "set_cookie"):
+            self.save_cookie(response, encrypted, max_age=session.max_age)
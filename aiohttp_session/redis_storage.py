@@ -1,11 +1,23 @@
+import asyncio
 import json
+import time
 import uuid
-from collections.abc import Callable
-from typing import Any
+from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from functools import partial
+from typing import Any, cast
 
 from aiohttp import web
 
-from . import AbstractStorage, Session
+from . import AbstractStorage, Session, SessionData
+from .batching import SingleFlight, WriteBatcher
+from .cache import SessionCache
+from .codecs import Codec
+from .compression import Compressor, DecompressionError, decompress_payload
+from .conflict import CAS_RETRIES, ConflictHandler, merge_changes
+from .hashring import HashRing
+from .log import log
+from .metrics import SessionObserver
+from .timing import phase
 
 try:
     from redis import VERSION as REDIS_VERSION, asyncio as aioredis
@@ -24,13 +36,16 @@ except ImportError:  # pragma: no cover
         )
         REDIS_VERSION = (4, 3)
 
+# Stored key, encoded session and its TTL.
+_WriteItem = tuple[str, bytes, int | None]
+
 
 class RedisStorage(AbstractStorage):
     """Redis storage"""
 
     def __init__(
         self,
-        redis_pool: "aioredis.Redis",
+        redis_pool: "aioredis.Redis | aioredis.RedisCluster",
         *,
         cookie_name: str = "AIOHTTP_SESSION",
         domain: str | None = None,
@@ -42,6 +57,21 @@ class RedisStorage(AbstractStorage):
         key_factory: Callable[[], str] = lambda: uuid.uuid4().hex,
         encoder: Callable[[object], str] = json.dumps,
         decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        lazy_decode: bool = False,
+        sliding_expiry: float | None = None,
+        batch_window: float | None = None,
+        batch_size: int = 100,
+        coalesce_loads: bool = False,
+        cache: SessionCache | None = None,
+        invalidation_channel: str | None = None,
+        compare_and_set: bool = False,
+        on_conflict: ConflictHandler = merge_changes,
+        hash_tag: bool = False,
+        compressor: Compressor | None = None,
+        compress_threshold: int = 256,
+        codec: Codec | None = None,
     ) -> None:
         super().__init__(
             cookie_name=cookie_name,
@@ -53,6 +83,11 @@ class RedisStorage(AbstractStorage):
             samesite=samesite,
             encoder=encoder,
             decoder=decoder,
+            skip_unchanged=skip_unchanged,
+            observer=observer,
+            compressor=compressor,
+            compress_threshold=compress_threshold,
+            codec=codec,
         )
         if aioredis is None:
             raise RuntimeError("Please install redis")
@@ -60,43 +95,393 @@ class RedisStorage(AbstractStorage):
         if REDIS_VERSION < (4, 3):
             raise RuntimeError("redis<4.3 is not supported")
         self._key_factory = key_factory
-        if not isinstance(redis_pool, aioredis.Redis):
-            raise TypeError(f"Expected redis.asyncio.Redis got {type(redis_pool)}")
+        self._lazy_decode = lazy_decode
+        if sliding_expiry is not None:
+            if max_age is None:
+                raise ValueError("sliding_expiry requires max_age")
+            if not 0 < sliding_expiry <= 1:
+                raise ValueError("sliding_expiry should be in (0, 1] range")
+        self._sliding_expiry = sliding_expiry
+        self._batcher: WriteBatcher[_WriteItem] | None = None
+        if batch_window is not None:
+            self._batcher = WriteBatcher(
+                self._write_batch, max_delay=batch_window, max_size=batch_size
+            )
+        self._loads: SingleFlight[str, tuple[bytes | None, int]] | None = None
+        if coalesce_loads:
+            self._loads = SingleFlight()
+        if cache is not None and sliding_expiry is not None:
+            # Cache hits don't see the remaining TTL to refresh it.
+            raise ValueError("cache can't be combined with sliding_expiry")
+        self._cache = cache
+        self._invalidation_channel = invalidation_channel
+        # Lets the invalidation listener ignore this storage's own writes.
+        self._node_id = uuid.uuid4().hex
+        if compare_and_set and batch_window is not None:
+            raise ValueError("compare_and_set can't be combined with batch_window")
+        self._compare_and_set = compare_and_set
+        self._on_conflict = on_conflict
+        self._hash_tag = hash_tag
+        cluster = getattr(aioredis, "RedisCluster", None)
+        if cluster is not None and isinstance(redis_pool, cluster):
+            # Cluster clients have neither pub/sub nor WATCH.
+            if invalidation_channel is not None:
+                raise ValueError("invalidation_channel isn't supported by RedisCluster")
+            if compare_and_set:
+                raise ValueError("compare_and_set isn't supported by RedisCluster")
+        elif not isinstance(redis_pool, aioredis.Redis):
+            raise TypeError(
+                "Expected redis.asyncio.Redis or redis.asyncio.RedisCluster"
+                f" got {type(redis_pool)}"
+            )
         self._redis = redis_pool
 
+    def stored_key(self, key: str) -> str:
+        """Redis key of the session *key*.
+
+        With *hash_tag*, the session key is enclosed in ``{}`` and Redis
+        Cluster places every key containing the same tag in one slot.
+        """
+        if self._hash_tag:
+            return self.cookie_name + "_{" + key + "}"
+        return self.cookie_name + "_" + key
+
+    def _client(self, stored_key: str) -> "aioredis.Redis | aioredis.RedisCluster":
+        """Redis client holding *stored_key*."""
+        return self._redis
+
+    def _clients(self) -> "list[aioredis.Redis | aioredis.RedisCluster]":
+        return [self._redis]
+
+    async def sample_payloads(self, count: int = 1000) -> list[bytes]:
+        """Return up to *count* stored sessions, uncompressed.
+
+        Meant for training compression dictionaries, keys are scanned in
+        the order Redis returns them.
+        """
+        samples: list[bytes] = []
+        for client in self._clients():
+            keys = []
+            async for key in client.scan_iter(match=self.cookie_name + "_*"):
+                keys.append(key)
+                if len(samples) + len(keys) >= count:
+                    break
+            if not keys:
+                continue
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(key)
+                values = await pipe.execute()
+            for value in values:
+                if value is None:
+                    continue
+                try:
+                    samples.append(decompress_payload(value, self._compressor))
+                except DecompressionError:
+                    continue
+            if len(samples) >= count:
+                break
+        return samples
+
     async def load_session(self, request: web.Request) -> Session:
-        cookie = self.load_cookie(request)
+        with phase(request, "cookie"):
+            cookie = self.load_cookie(request)
         if cookie is None:
             return Session(None, data=None, new=True, max_age=self.max_age)
         else:
             key = str(cookie)
-            data_bytes = await self._redis.get(self.cookie_name + "_" + key)
+            stored_key = self.stored_key(key)
+            data_bytes = None
+            ttl = -1
+            if self._cache is not None:
+                data_bytes = self._cache.get(stored_key)
+                if self._observer is not None:
+                    self._observer.on_cache(self, data_bytes is not None)
+            if data_bytes is None:
+                with phase(request, "fetch"):
+                    if self._loads is None:
+                        data_bytes, ttl = await self._fetch(stored_key)
+                    else:
+                        # Concurrent requests of the same client share the
+                        # round trip, each of them decodes its own Session.
+                        data_bytes, ttl = await self._loads.do(
+                            stored_key, partial(self._fetch, stored_key)
+                        )
+                if self._cache is not None and data_bytes is not None:
+                    self._cache.put(stored_key, data_bytes, self.max_age)
             if data_bytes is None:
                 return Session(None, data=None, new=True, max_age=self.max_age)
-            data_str = data_bytes.decode("utf-8")
-            try:
-                data = self._decoder(data_str)
-            except ValueError:
-                data = None
-            return Session(key, data=data, new=False, max_age=self.max_age)
+            if self._observer is not None:
+                self._observer.on_payload(self, "load", len(data_bytes))
+            session = Session(
+                key,
+                data=None,
+                new=False,
+                max_age=self.max_age,
+                loader=partial(self._decode_session_data, data_bytes, request),
+            )
+            if self._skip_unchanged or self._compare_and_set:
+                session._loaded_payload = data_bytes
+            if self._sliding_expiry is not None and ttl >= 0:
+                # The TTL was set to max_age on the last write or refresh.
+                max_age = cast(int, self.max_age)
+                elapsed = max(max_age - ttl, 0)
+                session._refreshed = int(time.time()) - elapsed
+                session._refresh_due = elapsed >= max_age * self._sliding_expiry
+            if not self._lazy_decode:
+                session._load_pending()
+            return session
+
+    async def _fetch(self, stored_key: str) -> tuple[bytes | None, int]:
+        if self._sliding_expiry is None:
+            return await self._client(stored_key).get(stored_key), -1
+        async with self._client(stored_key).pipeline(transaction=False) as pipe:
+            pipe.get(stored_key)
+            pipe.ttl(stored_key)
+            data_bytes, ttl = await pipe.execute()
+        return data_bytes, ttl
+
+    async def refresh_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        key = str(session.identity)
+        self.save_cookie(response, key, max_age=session.max_age)
+        stored_key = self.stored_key(key)
+        await self._client(stored_key).expire(
+            stored_key, session.max_age or cast(int, self.max_age)
+        )
 
     async def save_session(
         self, request: web.Request, response: web.StreamResponse, session: Session
     ) -> None:
+        write = self.prepare_save(request, response, session)
+        with phase(request, "store"):
+            await write
+
+    def prepare_save(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> Awaitable[object]:
         key = session.identity
-        if key is None:
-            key = self._key_factory()
-            self.save_cookie(response, key, max_age=session.max_age)
-        else:
-            if session.empty:
-                self.save_cookie(response, "", max_age=session.max_age)
-            else:
-                key = str(key)
+        with phase(request, "set_cookie"):
+            if key is None:
+                key = self._key_factory()
+                # Deferred writes of the session are routed by identity.
+                session.set_new_identity(key)
                 self.save_cookie(response, key, max_age=session.max_age)
+            else:
+                if session.empty:
+                    self.save_cookie(response, "", max_age=session.max_age)
+                else:
+                    key = str(key)
+                    self.save_cookie(response, key, max_age=session.max_age)
+
+        data = self._get_session_data(session)
+        stored_key = self.stored_key(key)
+        if self._loads is not None:
+            self._loads.forget(stored_key)
+        loaded = session._loaded_payload
+        if self._compare_and_set and loaded is not None and not session.empty:
+            return self._cas_write(stored_key, loaded, data, session.max_age)
+        payload = self._encode_payload(data, request)
+        if self._observer is not None:
+            self._observer.on_payload(self, "save", len(payload))
+        if self._cache is not None:
+            self._cache.put(stored_key, payload, session.max_age)
+        item = (stored_key, payload, session.max_age)
+        if self._batcher is not None:
+            return self._batcher.submit(item)
+        if self._invalidation_channel is not None:
+            return self._write_batch([item])
+        return cast(
+            Awaitable[object],
+            self._client(stored_key).set(stored_key, payload, ex=session.max_age),
+        )
 
-        data_str = self._encoder(self._get_session_data(session))
-        await self._redis.set(
-            self.cookie_name + "_" + key,
-            data_str,
-            ex=session.max_age,
+    async def _write_batch(self, items: list[_WriteItem]) -> None:
+        clients = self._clients()
+        if len(clients) == 1:
+            await self._write_items(clients[0], items)
+            return
+        # One pipeline per shard, sent concurrently.
+        by_client: dict[
+            int, tuple[aioredis.Redis | aioredis.RedisCluster, list[_WriteItem]]
+        ] = {}
+        for item in items:
+            client = self._client(item[0])
+            by_client.setdefault(id(client), (client, []))[1].append(item)
+        await asyncio.gather(
+            *(self._write_items(client, group) for client, group in by_client.values())
         )
+
+    async def _write_items(
+        self, client: "aioredis.Redis | aioredis.RedisCluster", items: list[_WriteItem]
+    ) -> None:
+        channel = self._invalidation_channel
+        async with client.pipeline(transaction=False) as pipe:
+            for stored_key, payload, max_age in items:
+                pipe.set(stored_key, payload, ex=max_age)
+                if channel is not None:
+                    # Never set for RedisCluster, which has no pub/sub.
+                    pipe.publish(  # type: ignore[union-attr]
+                        channel, self._node_id + ":" + stored_key
+                    )
+            await pipe.execute()
+
+    async def _cas_write(
+        self, stored_key: str, loaded: bytes, data: SessionData, max_age: int | None
+    ) -> None:
+        async with self._client(stored_key).pipeline(transaction=True) as pipe:
+            for _ in range(CAS_RETRIES):
+                await pipe.watch(stored_key)
+                current = await pipe.get(stored_key)
+                to_store: SessionData | None = data
+                if current is not None and current != loaded:
+                    to_store = self._resolve_conflict(
+                        data, loaded, current, self._on_conflict
+                    )
+                if to_store is None:
+                    await pipe.reset()  # type: ignore[no-untyped-call]
+                    if self._cache is not None:
+                        self._cache.invalidate(stored_key)
+                    return
+                payload = self._encode_payload(to_store)
+                if self._observer is not None:
+                    self._observer.on_payload(self, "save", len(payload))
+                pipe.multi()  # type: ignore[no-untyped-call]
+                pipe.set(stored_key, payload, ex=max_age)
+                if self._invalidation_channel is not None:
+                    pipe.publish(  # type: ignore[union-attr]
+                        self._invalidation_channel, self._node_id + ":" + stored_key
+                    )
+                try:
+                    await pipe.execute()
+                except aioredis.WatchError:
+                    continue
+                if self._cache is not None:
+                    self._cache.put(stored_key, payload, max_age)
+                return
+        raise RuntimeError(f"Session {stored_key} is modified concurrently")
+
+    async def invalidation_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        """Drop cached sessions written by other nodes, for app.cleanup_ctx."""
+        if self._cache is None or self._invalidation_channel is None:
+            raise RuntimeError("Both cache and invalidation_channel are required")
+        # Keys are announced on the instance they are written to.
+        cache, channel = self._cache, self._invalidation_channel
+        # Not a RedisCluster, it can't be created with invalidation_channel.
+        clients = cast(list[aioredis.Redis], self._clients())
+        tasks = [
+            asyncio.create_task(self._listen_invalidations(client, cache, channel))
+            for client in clients
+        ]
+        yield
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _listen_invalidations(
+        self, client: "aioredis.Redis", cache: SessionCache, channel: str
+    ) -> None:
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                # Writes made while not subscribed were missed.
+                cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    node_id, _, stored_key = data.partition(":")
+                    if node_id != self._node_id:
+                        cache.invalidate(stored_key)
+            except aioredis.ConnectionError:
+                log.warning("Session invalidation channel lost, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+
+class ShardedRedisStorage(RedisStorage):
+    """Redis storage spreading sessions over several Redis instances.
+
+    Keys are routed over a consistent-hash ring of the named *shards*.
+    """
+
+    def __init__(
+        self,
+        shards: Mapping[str, "aioredis.Redis"],
+        *,
+        cookie_name: str = "AIOHTTP_SESSION",
+        domain: str | None = None,
+        max_age: int | None = None,
+        path: str = "/",
+        secure: bool | None = None,
+        httponly: bool = True,
+        samesite: str | None = None,
+        key_factory: Callable[[], str] = lambda: uuid.uuid4().hex,
+        encoder: Callable[[object], str] = json.dumps,
+        decoder: Callable[[str], Any] = json.loads,
+        skip_unchanged: bool = False,
+        observer: SessionObserver | None = None,
+        lazy_decode: bool = False,
+        sliding_expiry: float | None = None,
+        batch_window: float | None = None,
+        batch_size: int = 100,
+        coalesce_loads: bool = False,
+        cache: SessionCache | None = None,
+        invalidation_channel: str | None = None,
+        compare_and_set: bool = False,
+        on_conflict: ConflictHandler = merge_changes,
+        hash_tag: bool = False,
+        compressor: Compressor | None = None,
+        compress_threshold: int = 256,
+        codec: Codec | None = None,
+        vnodes: int = 160,
+    ) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required")
+        super().__init__(
+            next(iter(shards.values())),
+            cookie_name=cookie_name,
+            domain=domain,
+            max_age=max_age,
+            path=path,
+            secure=secure,
+            httponly=httponly,
+            samesite=samesite,
+            key_factory=key_factory,
+            encoder=encoder,
+            decoder=decoder,
+            skip_unchanged=skip_unchanged,
+            observer=observer,
+            lazy_decode=lazy_decode,
+            sliding_expiry=sliding_expiry,
+            batch_window=batch_window,
+            batch_size=batch_size,
+            coalesce_loads=coalesce_loads,
+            cache=cache,
+            invalidation_channel=invalidation_channel,
+            compare_and_set=compare_and_set,
+            on_conflict=on_conflict,
+            hash_tag=hash_tag,
+            compressor=compressor,
+            compress_threshold=compress_threshold,
+            codec=codec,
+        )
+        for client in shards.values():
+            if not isinstance(client, aioredis.Redis):
+                raise TypeError(f"Expected redis.asyncio.Redis got {type(client)}")
+        self._ring = HashRing(shards, vnodes=vnodes)
+
+    @property
+    def ring(self) -> HashRing["aioredis.Redis"]:
+        return self._ring
+
+    def _client(self, stored_key: str) -> "aioredis.Redis":
+        return self._ring.get(stored_key)
+
+    def _clients(self) -> "list[aioredis.Redis | aioredis.RedisCluster]":
+        return list(self._ring.nodes.values())
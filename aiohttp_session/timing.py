@@ -0,0 +1,46 @@
+from time import perf_counter
+from types import TracebackType
+
+from aiohttp import web
+
+TIMINGS_KEY = "aiohttp_session_timings"
+
+
+class _Phase:
+    __slots__ = ("_timings", "_name", "_start")
+
+    def __init__(self, timings: dict[str, float] | None, name: str) -> None:
+        self._timings = timings
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        if self._timings is not None:
+            self._start = perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if self._timings is not None:
+            elapsed = perf_counter() - self._start
+            self._timings[self._name] = self._timings.get(self._name, 0.0) + elapsed
+
+
+def phase(request: web.Request | None, name: str) -> _Phase:
+    """Context manager adding the time spent in its block to *name* phase.
+
+    Does nothing unless the request is handled by a session middleware
+    created with ``server_timing=True``.
+    """
+    timings = None if request is None else request.get(TIMINGS_KEY)
+    return _Phase(timings, name)
+
+
+def format_server_timing(timings: dict[str, float]) -> str:
+    """Format phase durations as a ``Server-Timing`` header value."""
+    return ", ".join(
+        f"session-{name};dur={elapsed * 1000:.3f}" for name, elapsed in timings.items()
+    )
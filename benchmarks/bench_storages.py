@@ -0,0 +1,219 @@
+"""Load and save throughput of every storage.
+
+Each round handles :data:`OPS` requests, so the reported per-round
+times are ``OPS`` times the per-request latency of the storage.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Awaitable, Callable, Iterator
+from functools import partial
+from typing import Any
+
+import aiomcache
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from cryptography.fernet import Fernet
+from pytest_benchmark.fixture import BenchmarkFixture
+from redis import asyncio as aioredis
+
+from aiohttp_session import AbstractStorage, SimpleCookieStorage
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+from aiohttp_session.memcached_storage import MemcachedStorage
+from aiohttp_session.redis_storage import RedisStorage
+
+OPS = 100
+
+PAYLOADS = {"tiny": 16, "1k": 1024, "16k": 16 * 1024}
+
+
+def _orjson_dumps(obj: object) -> str:
+    import orjson
+
+    return orjson.dumps(obj).decode("utf-8")
+
+
+ENCODERS: dict[str, Callable[[object], str]] = {
+    "json": json.dumps,
+    "json-compact": partial(json.dumps, separators=(",", ":")),
+    "orjson": _orjson_dumps,
+}
+
+StorageFactory = Callable[[Callable[[object], str]], AbstractStorage]
+
+
+def make_payload(size: int) -> dict[str, object]:
+    """Session mapping encoding to about *size* bytes of JSON."""
+    data: dict[str, object] = {"user_id": 1234567}
+    n = 0
+    while len(json.dumps(data)) < size:
+        data[f"key{n}"] = "v" * min(48, size)
+        n += 1
+    return data
+
+
+@pytest.fixture(params=list(PAYLOADS))
+def payload(request: pytest.FixtureRequest) -> dict[str, object]:
+    return make_payload(PAYLOADS[request.param])
+
+
+@pytest.fixture(params=list(ENCODERS))
+def encoder(request: pytest.FixtureRequest) -> Callable[[object], str]:
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    return ENCODERS[request.param]
+
+
+@pytest.fixture(params=["simple", "encrypted", "nacl", "redis", "memcached"])
+def storage_factory(request: pytest.FixtureRequest) -> StorageFactory:
+    kind = request.param
+    if kind == "simple":
+        return lambda encoder: SimpleCookieStorage(encoder=encoder)
+    if kind == "encrypted":
+        fernet = Fernet(Fernet.generate_key())
+        return lambda encoder: EncryptedCookieStorage(fernet, encoder=encoder)
+    if kind == "nacl":
+        pytest.importorskip("nacl")
+        from nacl.secret import SecretBox
+        from nacl.utils import random
+
+        from aiohttp_session.nacl_storage import NaClCookieStorage
+
+        key = random(SecretBox.KEY_SIZE)
+        return lambda encoder: NaClCookieStorage(key, encoder=encoder)
+    if kind == "redis":
+        redis: aioredis.Redis = request.getfixturevalue("redis")
+        return lambda encoder: RedisStorage(redis, encoder=encoder)
+    memcached: aiomcache.Client = request.getfixturevalue("memcached")
+    return lambda encoder: MemcachedStorage(memcached, encoder=encoder)
+
+
+@pytest.fixture
+def storage(
+    storage_factory: StorageFactory, encoder: Callable[[object], str]
+) -> AbstractStorage:
+    return storage_factory(encoder)
+
+
+@pytest.fixture(scope="module")
+def pg_storage(
+    bench_loop: asyncio.AbstractEventLoop, pg_dsn: str
+) -> Iterator[AbstractStorage]:
+    aiopg = pytest.importorskip("aiopg")
+    example = pytest.importorskip("examples.postgres_storage")
+
+    async def create() -> Any:
+        pool = await aiopg.create_pool(pg_dsn)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("CREATE SCHEMA IF NOT EXISTS web")
+                await cur.execute(
+                    "CREATE TABLE IF NOT EXISTS web.sessions (uuid uuid PRIMARY KEY,"
+                    " session jsonb, created timestamp, expire timestamp)"
+                )
+        return pool
+
+    pool = bench_loop.run_until_complete(create())
+    yield example.PgStorage(pool)
+    pool.close()
+    bench_loop.run_until_complete(pool.wait_closed())
+
+
+async def stored_cookie(storage: AbstractStorage, data: dict[str, object]) -> str:
+    """Save a session with *data*, return the Cookie header loading it."""
+    session = await storage.new_session()
+    session.update(data)
+    response = web.Response()
+    await storage.save_session(make_mocked_request("GET", "/"), response, session)
+    morsel = response.cookies[storage.cookie_name]
+    return f"{storage.cookie_name}={morsel.coded_value}"
+
+
+def run_rounds(
+    benchmark: BenchmarkFixture,
+    loop: asyncio.AbstractEventLoop,
+    setup: Callable[[], list[Callable[[], Awaitable[object]]]],
+) -> None:
+    """Benchmark running the operations created by *setup* for every round.
+
+    Requests are created by *setup* outside of the measured time.
+    """
+
+    async def run(ops: list[Callable[[], Awaitable[object]]]) -> None:
+        for op in ops:
+            await op()
+
+    benchmark.extra_info["ops_per_round"] = OPS
+    benchmark.pedantic(  # type: ignore[no-untyped-call]
+        lambda ops: loop.run_until_complete(run(ops)),
+        setup=lambda: ((setup(),), {}),
+        rounds=10,
+        warmup_rounds=1,
+    )
+
+
+def bench_load(
+    benchmark: BenchmarkFixture,
+    bench_loop: asyncio.AbstractEventLoop,
+    storage: AbstractStorage,
+    payload: dict[str, object],
+) -> None:
+    cookie = bench_loop.run_until_complete(stored_cookie(storage, payload))
+
+    async def load(request: web.Request) -> None:
+        session = await storage.load_session(request)
+        # Touch the data, so lazily decoding storages pay for decoding.
+        assert len(session) == len(payload)
+
+    def setup() -> list[Callable[[], Awaitable[object]]]:
+        return [
+            partial(load, make_mocked_request("GET", "/", headers={"Cookie": cookie}))
+            for _ in range(OPS)
+        ]
+
+    run_rounds(benchmark, bench_loop, setup)
+
+
+def bench_save(
+    benchmark: BenchmarkFixture,
+    bench_loop: asyncio.AbstractEventLoop,
+    storage: AbstractStorage,
+    payload: dict[str, object],
+) -> None:
+    cookie = bench_loop.run_until_complete(stored_cookie(storage, payload))
+
+    async def prepare() -> list[Callable[[], Awaitable[object]]]:
+        ops: list[Callable[[], Awaitable[object]]] = []
+        for n in range(OPS):
+            request = make_mocked_request("GET", "/", headers={"Cookie": cookie})
+            session = await storage.load_session(request)
+            session["counter"] = n
+            ops.append(
+                partial(storage.save_session, request, web.Response(), session)
+            )
+        return ops
+
+    run_rounds(benchmark, bench_loop, lambda: bench_loop.run_until_complete(prepare()))
+
+
+@pytest.mark.parametrize("payload", ["1k"], indirect=True)
+def bench_postgres_load(
+    benchmark: BenchmarkFixture,
+    bench_loop: asyncio.AbstractEventLoop,
+    pg_storage: AbstractStorage,
+    payload: dict[str, object],
+) -> None:
+    bench_load(benchmark, bench_loop, pg_storage, payload)
+
+
+@pytest.mark.parametrize("payload", ["1k"], indirect=True)
+def bench_postgres_save(
+    benchmark: BenchmarkFixture,
+    bench_loop: asyncio.AbstractEventLoop,
+    pg_storage: AbstractStorage,
+    payload: dict[str, object],
+) -> None:
+    bench_save(benchmark, bench_loop, pg_storage, payload)
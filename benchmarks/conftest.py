@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import Iterator
+
+import aiomcache
+import pytest
+from redis import asyncio as aioredis
+
+from .servers import memcached_server, redis_server
+
+
+@pytest.fixture(scope="session")
+def bench_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    """Loop driving the storages, benchmarks themselves are synchronous."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def redis(bench_loop: asyncio.AbstractEventLoop) -> Iterator[aioredis.Redis]:
+    with redis_server() as server:
+        if server is None:
+            pytest.skip("Neither redis-server nor fakeredis is installed")
+        client = aioredis.Redis(port=server.port)
+        yield client
+        bench_loop.run_until_complete(client.aclose())
+
+
+@pytest.fixture(scope="session")
+def memcached(bench_loop: asyncio.AbstractEventLoop) -> Iterator[aiomcache.Client]:
+    with memcached_server() as server:
+        client = aiomcache.Client("127.0.0.1", server.port)
+        yield client
+        bench_loop.run_until_complete(client.close())
+
+
+@pytest.fixture(scope="session")
+def pg_dsn() -> str:
+    dsn = os.environ.get("AIOHTTP_SESSION_BENCH_PG_DSN")
+    if not dsn:
+        pytest.skip("AIOHTTP_SESSION_BENCH_PG_DSN is not set")
+    return dsn
@@ -0,0 +1,376 @@
+"""End-to-end load generator for session storages.
+
+Starts an aiohttp application configured with :func:`aiohttp_session.setup`
+in a separate process and drives it with many cookie-carrying clients
+at a target request rate::
+
+    python -m benchmarks.loadgen --storage redis --rate 2000 --duration 30 \\
+        --clients 500 --write-ratio 0.1 --sizes 256:0.8,4096:0.2
+
+Requests are issued open-loop: latency is measured from the time a
+request was scheduled, so a server falling behind shows up in the
+percentiles instead of silently lowering the request rate.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import socket
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from aiohttp_session import AbstractStorage, SimpleCookieStorage, get_session, setup
+from aiohttp_session.deferred import DeferredWriter
+
+from .servers import memcached_server, redis_server, unused_port
+
+STORAGES = ("simple", "encrypted", "nacl", "memory", "redis", "memcached")
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+@dataclass
+class Config:
+    storage: str = "simple"
+    rate: float = 500
+    duration: float = 10
+    warmup: float = 2
+    clients: int = 100
+    write_ratio: float = 0.1
+    sizes: list[tuple[int, float]] = field(default_factory=lambda: [(256, 1.0)])
+    arrival: str = "poisson"
+    prefetch: bool = False
+    deferred: bool = False
+    # Keyword arguments of the storage constructor, e.g. lazy_decode.
+    storage_options: dict[str, Any] = field(default_factory=dict)
+    backend_port: int = 0
+    seed: int | None = None
+
+
+def parse_sizes(value: str) -> list[tuple[int, float]]:
+    """Parse ``"256:0.8,4096:0.2"`` into (payload bytes, weight) pairs."""
+    sizes = []
+    for item in value.split(","):
+        size, _, weight = item.partition(":")
+        sizes.append((int(size), float(weight or 1)))
+    return sizes
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of sorted *values*."""
+    if not values:
+        return math.nan
+    rank = math.ceil(p / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def make_storage(config: Config) -> AbstractStorage:
+    options = config.storage_options
+    if config.storage == "simple":
+        return SimpleCookieStorage(**options)
+    if config.storage == "encrypted":
+        from cryptography.fernet import Fernet
+
+        from aiohttp_session.cookie_storage import EncryptedCookieStorage
+
+        return EncryptedCookieStorage(Fernet(Fernet.generate_key()), **options)
+    if config.storage == "nacl":
+        from nacl.secret import SecretBox
+        from nacl.utils import random as nacl_random
+
+        from aiohttp_session.nacl_storage import NaClCookieStorage
+
+        return NaClCookieStorage(nacl_random(SecretBox.KEY_SIZE), **options)
+    if config.storage == "memory":
+        from aiohttp_session.memory_storage import InMemoryStorage
+
+        return InMemoryStorage(**options)
+    if config.storage == "redis":
+        from redis import asyncio as aioredis
+
+        from aiohttp_session.redis_storage import RedisStorage
+
+        return RedisStorage(aioredis.Redis(port=config.backend_port), **options)
+    if config.storage == "memcached":
+        import aiomcache
+
+        from aiohttp_session.memcached_storage import MemcachedStorage
+
+        conn = aiomcache.Client("127.0.0.1", config.backend_port, pool_size=10)
+        return MemcachedStorage(conn, **options)
+    raise ValueError(f"Unknown storage {config.storage!r}")
+
+
+async def init_handler(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    size = int(request.query["size"])
+    session["payload"] = "x" * size
+    session["counter"] = 0
+    return web.Response(text="OK")
+
+
+async def read_handler(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    return web.Response(text=str(session.get("counter")))
+
+
+async def write_handler(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    session["counter"] = session.get("counter", 0) + 1
+    return web.Response(text=str(session["counter"]))
+
+
+def make_app(config: Config) -> web.Application:
+    app = web.Application()
+    setup(
+        app,
+        make_storage(config),
+        prefetch=config.prefetch,
+        writer=DeferredWriter() if config.deferred else None,
+    )
+    app.router.add_post("/init", init_handler)
+    app.router.add_get("/read", read_handler)
+    app.router.add_post("/write", write_handler)
+    return app
+
+
+def _serve(config: Config, port: int) -> None:
+    web.run_app(
+        make_app(config), host="127.0.0.1", port=port, print=None, access_log=None
+    )
+
+
+@contextmanager
+def app_server(config: Config) -> Iterator[str]:
+    """Run the application in a child process, yield its base URL."""
+    port = unused_port()
+    proc = multiprocessing.get_context("spawn").Process(
+        target=_serve, args=(config, port), daemon=True
+    )
+    proc.start()
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                    break
+            except OSError:
+                if not proc.is_alive() or time.monotonic() > deadline:
+                    raise RuntimeError("Application server didn't start") from None
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, elapsed: float) -> dict[str, float]:
+        values = sorted(self.latencies)
+        result = {
+            "requests": len(values),
+            "errors": self.errors,
+            "throughput": len(values) / elapsed,
+        }
+        for p in PERCENTILES:
+            result[f"p{p:g}_ms"] = percentile(values, p) * 1000
+        result["max_ms"] = (values[-1] if values else math.nan) * 1000
+        return result
+
+
+async def _request(
+    client: aiohttp.ClientSession,
+    method: str,
+    url: str,
+    scheduled: float,
+    stats: Stats | None,
+) -> None:
+    try:
+        async with client.request(method, url) as resp:
+            await resp.read()
+            ok = resp.status == 200
+    except aiohttp.ClientError:
+        ok = False
+    if stats is None:
+        return
+    if ok:
+        stats.latencies.append(time.perf_counter() - scheduled)
+    else:
+        stats.errors += 1
+
+
+async def generate_load(config: Config, base_url: str) -> dict[str, dict[str, float]]:
+    rnd = random.Random(config.seed)
+    sizes = [size for size, _ in config.sizes]
+    weights = [weight for _, weight in config.sizes]
+    connector = aiohttp.TCPConnector(limit=0)
+    clients = [
+        aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            # Cookies for an IP address host are only kept by an unsafe jar.
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+        for _ in range(config.clients)
+    ]
+    stats = {"read": Stats(), "write": Stats()}
+    try:
+        await asyncio.gather(
+            *(
+                _request(
+                    client,
+                    "POST",
+                    f"{base_url}/init?size={rnd.choices(sizes, weights)[0]}",
+                    time.perf_counter(),
+                    None,
+                )
+                for client in clients
+            )
+        )
+        tasks = set()
+        start = time.perf_counter()
+        measure_from = start + config.warmup
+        end = measure_from + config.duration
+        scheduled = start
+        while scheduled < end:
+            if config.arrival == "poisson":
+                scheduled += rnd.expovariate(config.rate)
+            else:
+                scheduled += 1 / config.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = "write" if rnd.random() < config.write_ratio else "read"
+            task = asyncio.create_task(
+                _request(
+                    rnd.choice(clients),
+                    "POST" if kind == "write" else "GET",
+                    f"{base_url}/{kind}",
+                    scheduled,
+                    stats[kind] if scheduled >= measure_from else None,
+                )
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = max(time.perf_counter(), end) - measure_from
+    finally:
+        for client in clients:
+            await client.close()
+        await connector.close()
+    total = Stats(
+        stats["read"].latencies + stats["write"].latencies,
+        stats["read"].errors + stats["write"].errors,
+    )
+    return {
+        "read": stats["read"].summary(elapsed),
+        "write": stats["write"].summary(elapsed),
+        "all": total.summary(elapsed),
+    }
+
+
+def format_report(config: Config, results: dict[str, dict[str, float]]) -> str:
+    options = ", ".join(f"{k}={v!r}" for k, v in config.storage_options.items())
+    modes = [m for m in ("prefetch", "deferred") if getattr(config, m)]
+    lines = [
+        f"storage: {config.storage}({options}) {' '.join(modes)}".rstrip(),
+        f"target: {config.rate:g} req/s, {config.clients} clients, "
+        f"write ratio {config.write_ratio:g}",
+        "",
+        f"{'':6} {'req/s':>9} {'errors':>7} "
+        + " ".join(f"{'p' + format(p, 'g'):>8}" for p in PERCENTILES)
+        + f" {'max':>8}",
+    ]
+    for kind, summary in results.items():
+        lines.append(
+            f"{kind:6} {summary['throughput']:9.1f} {summary['errors']:7d} "
+            + " ".join(f"{summary[f'p{p:g}_ms']:8.2f}" for p in PERCENTILES)
+            + f" {summary['max_ms']:8.2f}"
+        )
+    lines.append("(latencies in ms)")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Sequence[str]) -> tuple[Config, bool]:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen")
+    parser.add_argument("--storage", choices=STORAGES, default="simple")
+    parser.add_argument("--rate", type=float, default=500, help="requests/s")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=[(256, 1.0)],
+        help="session payload bytes and weights, e.g. 256:0.8,4096:0.2",
+    )
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--prefetch", action="store_true")
+    parser.add_argument("--deferred", action="store_true")
+    parser.add_argument(
+        "--option",
+        action="append",
+        default=[],
+        metavar="NAME=JSON",
+        help="storage constructor argument, e.g. lazy_decode=true",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args(argv)
+    storage_options = {}
+    for option in args.option:
+        name, _, value = option.partition("=")
+        storage_options[name.replace("-", "_")] = json.loads(value)
+    config = Config(
+        storage=args.storage,
+        rate=args.rate,
+        duration=args.duration,
+        warmup=args.warmup,
+        clients=args.clients,
+        write_ratio=args.write_ratio,
+        sizes=args.sizes,
+        arrival=args.arrival,
+        prefetch=args.prefetch,
+        deferred=args.deferred,
+        storage_options=storage_options,
+        seed=args.seed,
+    )
+    return config, args.json
+
+
+def main(argv: Sequence[str]) -> None:
+    config, as_json = parse_args(argv)
+    with ExitStack() as stack:
+        if config.storage == "redis":
+            server = stack.enter_context(redis_server())
+            if server is None:
+                raise SystemExit("Neither redis-server nor fakeredis is installed")
+            config.backend_port = server.port
+        elif config.storage == "memcached":
+            config.backend_port = stack.enter_context(memcached_server()).port
+        base_url = stack.enter_context(app_server(config))
+        results = asyncio.run(generate_load(config, base_url))
+    if as_json:
+        print(json.dumps({"config": asdict(config), "results": results}, indent=2))
+    else:
+        print(format_report(config, results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
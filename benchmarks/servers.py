@@ -0,0 +1,99 @@
+"""Locally spawned backend servers for benchmarks.
+
+Servers are started from binaries found on ``PATH``, or replaced by
+the stand-ins of :mod:`benchmarks.standins`, and listen on a free
+localhost port, so no Docker daemon is needed.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+# Stand-ins are run as ``benchmarks.standins`` from the repository root.
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def unused_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        port: int = s.getsockname()[1]
+    return port
+
+
+def _wait_for_port(port: int, proc: subprocess.Popen[bytes], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args!r} exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{proc.args!r} didn't listen on {port} in {timeout}s")
+
+
+@contextmanager
+def spawn(args: list[str], port: int, timeout: float = 10) -> Iterator[int]:
+    proc = subprocess.Popen(
+        args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port(port, proc, timeout)
+        yield port
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+class Server(NamedTuple):
+    port: int
+    # A pure Python stand-in from benchmarks.standins instead of the binary.
+    standin: bool
+
+
+def _standin_args(kind: str, port: int) -> list[str]:
+    return [sys.executable, "-m", "benchmarks.standins", kind, str(port)]
+
+
+@contextmanager
+def redis_server() -> Iterator[Server | None]:
+    """Run ``redis-server`` without persistence or the fakeredis stand-in."""
+    port = unused_port()
+    binary = shutil.which("redis-server")
+    if binary is not None:
+        args = [binary, "--port", str(port), "--bind", "127.0.0.1"]
+        args += ["--save", "", "--appendonly", "no"]
+    elif importlib.util.find_spec("fakeredis") is not None:
+        args = _standin_args("redis", port)
+    else:
+        yield None
+        return
+    with spawn(args, port):
+        yield Server(port, standin=binary is None)
+
+
+@contextmanager
+def memcached_server() -> Iterator[Server]:
+    """Run ``memcached`` or the pure Python stand-in."""
+    port = unused_port()
+    binary = shutil.which("memcached")
+    if binary is not None:
+        args = [binary, "-p", str(port), "-l", "127.0.0.1", "-U", "0", "-m", "256"]
+    else:
+        args = _standin_args("memcached", port)
+    with spawn(args, port):
+        yield Server(port, standin=binary is None)
@@ -0,0 +1,130 @@
+"""Pure Python stand-ins for backend servers missing on the machine.
+
+Run in a subprocess by :mod:`benchmarks.servers`::
+
+    python -m benchmarks.standins redis 6379
+    python -m benchmarks.standins memcached 11211
+
+The Redis stand-in is fakeredis' TCP server. The Memcached one
+implements the subset of the text protocol used by aiomcache and
+``MemcachedStorage``. Their numbers are only comparable with each other,
+not with real servers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+THIRTY_DAYS = 30 * 24 * 60 * 60
+
+
+class _MemcachedStore:
+    def __init__(self) -> None:
+        # key -> (value, expiration timestamp or 0, cas unique)
+        self.items: dict[bytes, tuple[bytes, float, int]] = {}
+        self.cas_unique = 0
+
+    def get(self, key: bytes) -> tuple[bytes, float, int] | None:
+        item = self.items.get(key)
+        if item is not None and item[1] and item[1] < time.time():
+            del self.items[key]
+            return None
+        return item
+
+    def store(self, key: bytes, value: bytes, exptime: int) -> None:
+        self.cas_unique += 1
+        self.items[key] = (value, _expiration(exptime), self.cas_unique)
+
+
+def _expiration(exptime: int) -> float:
+    if exptime and exptime <= THIRTY_DAYS:
+        return time.time() + exptime
+    return exptime
+
+
+async def _handle(
+    store: _MemcachedStore, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        while line := await reader.readline():
+            parts = line.split()
+            if not parts:
+                continue
+            cmd = parts[0]
+            if cmd in (b"get", b"gets"):
+                out = []
+                for key in parts[1:]:
+                    item = store.get(key)
+                    if item is None:
+                        continue
+                    header = b"VALUE %s 0 %d" % (key, len(item[0]))
+                    if cmd == b"gets":
+                        header += b" %d" % item[2]
+                    out += [header, item[0]]
+                out.append(b"END\r\n")
+                writer.write(b"\r\n".join(out))
+            elif cmd in (b"set", b"add", b"cas"):
+                key, exptime, size = parts[1], int(parts[3]), int(parts[4])
+                value = (await reader.readexactly(size + 2))[:-2]
+                current = store.get(key)
+                if cmd == b"add" and current is not None:
+                    writer.write(b"NOT_STORED\r\n")
+                elif cmd == b"cas" and current is None:
+                    writer.write(b"NOT_FOUND\r\n")
+                elif cmd == b"cas" and current is not None and current[2] != int(
+                    parts[5]
+                ):
+                    writer.write(b"EXISTS\r\n")
+                else:
+                    store.store(key, value, exptime)
+                    writer.write(b"STORED\r\n")
+            elif cmd == b"touch":
+                item = store.get(parts[1])
+                if item is None:
+                    writer.write(b"NOT_FOUND\r\n")
+                else:
+                    expiration = _expiration(int(parts[2]))
+                    store.items[parts[1]] = (item[0], expiration, item[2])
+                    writer.write(b"TOUCHED\r\n")
+            elif cmd == b"delete":
+                found = store.items.pop(parts[1], None) is not None
+                writer.write(b"DELETED\r\n" if found else b"NOT_FOUND\r\n")
+            elif cmd == b"version":
+                writer.write(b"VERSION 1.6.0-standin\r\n")
+            else:
+                writer.write(b"ERROR\r\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _serve_memcached(port: int) -> None:
+    store = _MemcachedStore()
+    server = await asyncio.start_server(
+        lambda r, w: _handle(store, r, w), "127.0.0.1", port
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def _serve_redis(port: int) -> None:
+    from fakeredis import TcpFakeServer
+
+    with TcpFakeServer(("127.0.0.1", port)) as server:
+        server.serve_forever()
+
+
+def main(argv: list[str]) -> None:
+    kind, port = argv[0], int(argv[1])
+    if kind == "redis":
+        _serve_redis(port)
+    elif kind == "memcached":
+        asyncio.run(_serve_memcached(port))
+    else:
+        raise SystemExit(f"Unknown server {kind!r}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -7,7 +7,7 @@ import psycopg2.extras
 from aiohttp import web
 from aiopg import Pool
 
-from aiohttp_session import AbstractStorage, Session
+from aiohttp_session import AbstractStorage, Session, SessionDelta
 
 
 class PgStorage(AbstractStorage):
@@ -93,3 +93,34 @@ class PgStorage(AbstractStorage):
                     + " SET (session,expire)=(EXCLUDED.session, EXCLUDED.expire)",
                     [key, data_encoded, data["created"], expire],
                 )
+
+    async def save_session_delta(
+        self,
+        request: web.Request,
+        response: web.StreamResponse,
+        session: Session,
+        delta: SessionDelta,
+    ) -> None:
+        if session.identity is None or session.empty:
+            return await self.save_session(request, response, session)
+
+        key = str(session.identity)
+        self.save_cookie(response, key, max_age=session.max_age)
+
+        updated_encoded = self._encoder(delta["updated"])
+        deleted = list(delta["deleted"])
+        expire = session.created + (session.max_age or 0)
+        async with self._pg.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE web.sessions"
+                    + " SET session=(session || %s) - %s::text[],"
+                    + " expire=to_timestamp(%s)"
+                    + " WHERE uuid = %s",
+                    [updated_encoded, deleted, expire, key],
+                )
+                updated = cur.rowcount
+
+        if not updated:
+            # The row is gone (e.g. expired and purged), write it back in full.
+            await self.save_session(request, response, session)
@@ -26,6 +26,10 @@ extras_require = {
     "pycrypto": ["cryptography"],
     "secure": ["cryptography"],
     "pynacl": ["pynacl"],
+    "zstd": ["zstandard"],
+    "brotli": ["brotli"],
+    "msgpack": ["msgpack"],
+    "orjson": ["orjson"],
 }
 
 
@@ -89,3 +89,41 @@ async def test_max_age_session_reset(aiohttp_client: AiohttpClient) -> None:
         async with client.get("/") as resp:
             sess = await resp.json()
             assert sess == {}
+
+
+async def test_skip_unchanged(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.Response:
+        session = await get_session(request)
+        session["a"] = int(request.rel_url.query.get("a", 1))
+        return web.Response(body=b"OK")
+
+    app = web.Application()
+    setup_middleware(app, SimpleCookieStorage(max_age=10, skip_unchanged=True))
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+
+    async with client.get("/") as resp:
+        assert resp.status == 200
+        assert "AIOHTTP_SESSION" in resp.cookies
+
+    async with client.get("/") as resp:
+        assert resp.status == 200
+        assert "AIOHTTP_SESSION" not in resp.cookies
+
+    async with client.get("/?a=2") as resp:
+        assert resp.status == 200
+        c = resp.cookies["AIOHTTP_SESSION"]
+        assert {"a": 2} == json.loads(c.value)["session"]
+
+
+async def test_skip_unchanged_disabled(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.Response:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    client = await aiohttp_client(create_app(handler))
+    make_cookie(client, {"a": 1, "b": 2})
+    async with client.get("/") as resp:
+        assert resp.status == 200
+        assert "AIOHTTP_SESSION" in resp.cookies
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from aiohttp_session.batching import SingleFlight, WriteBatcher
+
+
+async def test_invalid_params() -> None:
+    async def flush(items: list[int]) -> None:
+        """Dummy"""
+
+    with pytest.raises(ValueError):
+        WriteBatcher(flush, max_delay=-1)
+    with pytest.raises(ValueError):
+        WriteBatcher(flush, max_size=0)
+
+
+async def test_flush_after_delay() -> None:
+    batches: list[list[int]] = []
+
+    async def flush(items: list[int]) -> None:
+        batches.append(items)
+
+    batcher = WriteBatcher(flush, max_delay=0.01)
+    futures = [batcher.submit(i) for i in range(3)]
+    await asyncio.sleep(0)
+    assert batches == []
+    await asyncio.gather(*futures)
+    assert batches == [[0, 1, 2]]
+
+
+async def test_flush_on_size() -> None:
+    batches: list[list[int]] = []
+
+    async def flush(items: list[int]) -> None:
+        batches.append(items)
+
+    batcher = WriteBatcher(flush, max_delay=10, max_size=2)
+    futures = [batcher.submit(i) for i in range(4)]
+    await asyncio.gather(*futures)
+    assert batches == [[0, 1], [2, 3]]
+
+
+async def test_flush_error() -> None:
+    async def flush(items: list[int]) -> None:
+        raise ConnectionError()
+
+    batcher = WriteBatcher(flush, max_delay=0)
+    futures = [batcher.submit(i) for i in range(2)]
+    for fut in futures:
+        with pytest.raises(ConnectionError):
+            await fut
+
+
+async def test_single_flight() -> None:
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    flight: SingleFlight[str, int] = SingleFlight()
+    tasks = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+    other = asyncio.create_task(flight.do("other", fetch))
+    await asyncio.sleep(0)
+    # Cancelling one caller doesn't cancel the shared call.
+    tasks[0].cancel()
+    release.set()
+    assert await asyncio.gather(*tasks[1:]) == [1, 1]
+    assert await other == 2
+    assert calls == 2
+
+    # Completed calls aren't reused.
+    assert await flight.do("key", fetch) == 3
+
+
+async def test_single_flight_forget() -> None:
+    release = asyncio.Event()
+    results = iter(["old", "new"])
+
+    async def fetch() -> str:
+        await release.wait()
+        return next(results)
+
+    flight: SingleFlight[str, str] = SingleFlight()
+    first = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    flight.forget("key")
+    second = asyncio.create_task(flight.do("key", fetch))
+    release.set()
+    assert await first == "old"
+    assert await second == "new"
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from pytest_mock import MockFixture
+
+from aiohttp_session.cache import SessionCache
+
+
+def test_invalid_params() -> None:
+    with pytest.raises(ValueError):
+        SessionCache(max_entries=0)
+    with pytest.raises(ValueError):
+        SessionCache(ttl=0)
+
+
+def test_get_put() -> None:
+    cache = SessionCache()
+    assert cache.get("a") is None
+    cache.put("a", b"payload")
+    assert cache.get("a") == b"payload"
+    assert len(cache) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction() -> None:
+    cache = SessionCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+
+
+def test_expiry(mocker: MockFixture) -> None:
+    now = time.monotonic()
+    monotonic = mocker.patch("aiohttp_session.cache.time.monotonic", return_value=now)
+    cache = SessionCache(ttl=60)
+    cache.put("a", b"1")
+    cache.put("b", b"2", max_age=10)
+    monotonic.return_value = now + 30
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+    monotonic.return_value = now + 60
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate() -> None:
+    cache = SessionCache()
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
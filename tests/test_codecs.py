@@ -0,0 +1,194 @@
+import json
+from functools import partial
+
+import pytest
+from aiohttp import web
+from cryptography.fernet import Fernet
+from pytest_mock import MockFixture
+
+from aiohttp_session import SimpleCookieStorage, get_session, session_middleware
+from aiohttp_session.codecs import (
+    TAGGED,
+    Codec,
+    CodecRegistry,
+    MsgpackCodec,
+    OrjsonCodec,
+    TextCodec,
+)
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+
+from .typedefs import AiohttpClient
+
+DATA = {"created": 1700000000, "session": {"a": 1, "b": ["x", None], "c": "é"}}
+
+
+def make_codecs() -> list[Codec]:
+    codecs: list[Codec] = [TextCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except RuntimeError:
+        pass
+    try:
+        codecs.append(MsgpackCodec())
+    except RuntimeError:
+        pass
+    return codecs
+
+
+@pytest.mark.parametrize("codec", make_codecs(), ids=type)
+def test_round_trip(codec: Codec) -> None:
+    payload = codec.encode(DATA)
+    assert isinstance(payload, bytes)
+    assert payload[:1] not in (b"\xff", TAGGED)
+    assert codec.decode(payload) == DATA
+
+
+def test_text_codec() -> None:
+    codec = TextCodec()
+    assert codec.encode(DATA) == json.dumps(DATA).encode("utf-8")
+    with pytest.raises(ValueError):
+        codec.decode(b"\xfe")
+    assert codec.encode_text(DATA) == json.dumps(DATA)
+    assert codec.decode_text(json.dumps(DATA)) == DATA
+
+
+def test_orjson_compatible() -> None:
+    pytest.importorskip("orjson")
+    assert OrjsonCodec().decode(TextCodec().encode(DATA)) == DATA
+    assert TextCodec().decode(OrjsonCodec().encode(DATA)) == DATA
+
+
+def test_msgpack_invalid() -> None:
+    pytest.importorskip("msgpack")
+    codec = MsgpackCodec()
+    with pytest.raises(ValueError):
+        codec.decode(codec.encode(DATA)[:-3])
+
+
+@pytest.mark.parametrize("codec", make_codecs(), ids=type)
+async def test_storage(aiohttp_client: AiohttpClient, codec: Codec) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.json_response(dict(session))
+
+    storage = EncryptedCookieStorage(Fernet(Fernet.generate_key()), codec=codec)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 1}
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 2}
+
+
+async def test_simple_storage_text_codec(
+    aiohttp_client: AiohttpClient, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.json_response(dict(session))
+
+    codec = TextCodec(partial(json.dumps, separators=(",", ":")))
+    encode = mocker.spy(codec, "encode")
+    decode = mocker.spy(codec, "decode")
+    storage = SimpleCookieStorage(codec=codec)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 1}
+    assert '"session":{"n":1}' in resp.cookies["AIOHTTP_SESSION"].value
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 2}
+    # Cookies are text, the str codec is used without bytes round trips.
+    assert encode.call_count == 0
+    assert decode.call_count == 0
+
+
+def test_simple_storage_binary_codec() -> None:
+    with pytest.raises(ValueError):
+        SimpleCookieStorage(codec=CodecRegistry({1: TextCodec()}))
+    for codec in make_codecs()[1:]:
+        with pytest.raises(ValueError):
+            SimpleCookieStorage(codec=codec)
+
+
+def test_codec_with_encoder() -> None:
+    with pytest.raises(ValueError):
+        SimpleCookieStorage(codec=TextCodec(), encoder=str)
+    with pytest.raises(ValueError):
+        EncryptedCookieStorage(
+            Fernet(Fernet.generate_key()), codec=TextCodec(), decoder=int
+        )
+
+
+# Compact JSON, standing for a faster serializer in migration tests.
+COMPACT = TextCodec(partial(json.dumps, separators=(",", ":")))
+
+
+def test_registry() -> None:
+    registry = CodecRegistry({1: TextCodec(), 2: COMPACT})
+    assert registry.preferred == 2
+    payload = registry.encode(DATA)
+    assert payload == TAGGED + b"\x02" + COMPACT.encode(DATA)
+    assert registry.decode(payload) == DATA
+    assert registry.decode(TAGGED + b"\x01" + TextCodec().encode(DATA)) == DATA
+    # Payloads saved before the registry was configured.
+    assert registry.decode(TextCodec().encode(DATA)) == DATA
+
+    registry = CodecRegistry({1: TextCodec(), 2: COMPACT}, preferred=1)
+    assert registry.encode(DATA)[:2] == TAGGED + b"\x01"
+
+
+def test_registry_untagged() -> None:
+    legacy = TextCodec(decoder=lambda s: {"legacy": json.loads(s)})
+    registry = CodecRegistry({1: COMPACT}, untagged=legacy)
+    assert registry.decode(b"1") == {"legacy": 1}
+
+
+def test_registry_invalid() -> None:
+    with pytest.raises(ValueError):
+        CodecRegistry({})
+    with pytest.raises(ValueError):
+        CodecRegistry({256: COMPACT})
+    with pytest.raises(ValueError):
+        CodecRegistry({1: COMPACT}, preferred=2)
+    registry = CodecRegistry({1: COMPACT})
+    with pytest.raises(ValueError):
+        registry.decode(TAGGED + b"\x02{}")
+    with pytest.raises(ValueError):
+        registry.decode(TAGGED)
+
+
+async def test_registry_migration(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.json_response(dict(session))
+
+    fernet = Fernet(Fernet.generate_key())
+    registry = CodecRegistry({1: TextCodec(), 2: COMPACT})
+    app = web.Application(
+        middlewares=[session_middleware(EncryptedCookieStorage(fernet))]
+    )
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 1}
+
+    # Sessions survive switching codecs and are saved with the new one.
+    storage = EncryptedCookieStorage(fernet, codec=registry)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    new_client = await aiohttp_client(app)
+    new_client.session.cookie_jar.update_cookies(
+        {"AIOHTTP_SESSION": resp.cookies["AIOHTTP_SESSION"].value}
+    )
+    resp = await new_client.get("/")
+    assert await resp.json() == {"n": 2}
+    cookie = resp.cookies["AIOHTTP_SESSION"].value
+    assert fernet.decrypt(cookie.encode("utf-8"))[:2] == TAGGED + b"\x02"
+    resp = await new_client.get("/")
+    assert await resp.json() == {"n": 3}
@@ -0,0 +1,124 @@
+import json
+import random
+
+import pytest
+
+from aiohttp_session.compression import (
+    MAGIC,
+    BrotliCompressor,
+    Compressor,
+    DecompressionError,
+    ZlibCompressor,
+    ZstdCompressor,
+    ZstdDictCompressor,
+    compress_payload,
+    decompress_payload,
+    is_compressed,
+    train_dictionary,
+)
+
+PAYLOAD = b'{"created": 1700000000, "session": {"items": [' + b'"item", ' * 100 + b"]}}"
+
+
+def make_compressors() -> list[Compressor]:
+    compressors: list[Compressor] = [ZlibCompressor()]
+    try:
+        compressors.append(ZstdCompressor())
+    except RuntimeError:
+        pass
+    try:
+        compressors.append(BrotliCompressor())
+    except RuntimeError:
+        pass
+    return compressors
+
+
+@pytest.mark.parametrize("compressor", make_compressors(), ids=type)
+def test_round_trip(compressor: Compressor) -> None:
+    compressed = compress_payload(PAYLOAD, compressor)
+    assert is_compressed(compressed)
+    assert compressed[:2] == MAGIC + bytes((compressor.format_id,))
+    assert len(compressed) < len(PAYLOAD)
+    assert decompress_payload(compressed, compressor) == PAYLOAD
+    # Any built-in format loads, whichever compressor is configured.
+    assert decompress_payload(compressed) == PAYLOAD
+
+
+def test_incompressible_kept() -> None:
+    payload = b'{"a": 1}'
+    assert compress_payload(payload, ZlibCompressor()) == payload
+
+
+def test_uncompressed_passed_through() -> None:
+    assert not is_compressed(PAYLOAD)
+    assert decompress_payload(PAYLOAD, ZlibCompressor()) is PAYLOAD
+
+
+def test_invalid_payloads() -> None:
+    with pytest.raises(DecompressionError):
+        decompress_payload(MAGIC + b"\x7fdata")
+    with pytest.raises(DecompressionError):
+        decompress_payload(MAGIC)
+    with pytest.raises(DecompressionError):
+        decompress_payload(MAGIC + b"\x01corrupted")
+
+
+def make_sessions(count: int, seed: int) -> list[bytes]:
+    rnd = random.Random(seed)
+    return [
+        json.dumps(
+            {
+                "created": 1700000000 + rnd.randrange(10**6),
+                "session": {
+                    "user_id": rnd.randrange(10**6),
+                    "locale": rnd.choice(["en-US", "de-DE", "fr-FR"]),
+                    "csrf_token": f"{rnd.getrandbits(128):032x}",
+                },
+            }
+        ).encode("utf-8")
+        for _ in range(count)
+    ]
+
+
+def test_dictionary_round_trip() -> None:
+    pytest.importorskip("zstandard")
+    dictionary = train_dictionary(make_sessions(1000, 0), size=4096)
+    compressor = ZstdDictCompressor({1: dictionary})
+    assert compressor.version == 1
+    payload = make_sessions(1, 1)[0]
+    compressed = compress_payload(payload, compressor)
+    assert compressed[:3] == MAGIC + b"\x04\x01"
+    # Small payloads compress well with a dictionary only.
+    assert len(compressed) < len(compress_payload(payload, ZstdCompressor()))
+    assert decompress_payload(compressed, compressor) == payload
+    with pytest.raises(DecompressionError):
+        decompress_payload(compressed)
+
+
+def test_dictionary_rotation() -> None:
+    pytest.importorskip("zstandard")
+    old = ZstdDictCompressor({1: train_dictionary(make_sessions(1000, 0))})
+    payload = make_sessions(1, 1)[0]
+    compressed = compress_payload(payload, old)
+    dictionaries = {
+        1: train_dictionary(make_sessions(1000, 0)),
+        2: train_dictionary(make_sessions(1000, 2)),
+    }
+    new = ZstdDictCompressor(dictionaries)
+    assert new.version == 2
+    assert compress_payload(payload, new)[2] == 2
+    assert decompress_payload(compressed, new) == payload
+    dropped = ZstdDictCompressor({2: dictionaries[2]})
+    with pytest.raises(DecompressionError):
+        decompress_payload(compressed, dropped)
+
+
+def test_dictionary_invalid_params() -> None:
+    pytest.importorskip("zstandard")
+    dictionary = train_dictionary(make_sessions(1000, 0))
+    with pytest.raises(ValueError):
+        ZstdDictCompressor({})
+    with pytest.raises(ValueError):
+        ZstdDictCompressor({256: dictionary})
+    with pytest.raises(ValueError):
+        ZstdDictCompressor({1: dictionary}, version=2)
@@ -0,0 +1,20 @@
+from aiohttp_session.conflict import merge_changes
+
+
+def test_merge_disjoint_changes() -> None:
+    base = {"a": 1, "b": 2, "c": 3}
+    ours = {"a": 10, "c": 3, "d": 4}
+    theirs = {"a": 1, "b": 2, "c": 30, "e": 5}
+    assert merge_changes(base, ours, theirs) == {"a": 10, "c": 30, "d": 4, "e": 5}
+
+
+def test_merge_overlapping_changes() -> None:
+    base = {"a": 1}
+    assert merge_changes(base, {"a": 2}, {"a": 3}) == {"a": 2}
+    # A key deleted by the request stays deleted.
+    assert merge_changes(base, {}, {"a": 3}) == {}
+
+
+def test_merge_unchanged() -> None:
+    base = {"a": 1}
+    assert merge_changes(base, base, {"b": 2}) == {"b": 2}
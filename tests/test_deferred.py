@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+from collections.abc import Awaitable
+
+import pytest
+from aiohttp import web
+
+from aiohttp_session import (
+    Session,
+    SimpleCookieStorage,
+    get_session,
+    setup as setup_middleware,
+)
+from aiohttp_session.deferred import DeferredWriter
+
+from .typedefs import AiohttpClient
+
+
+class BackendStorage(SimpleCookieStorage):
+    """Cookie storage pretending to have a slow backend write."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = asyncio.Event()
+        self.written: list[Session] = []
+
+    async def _write(self, session: Session) -> None:
+        await self.release.wait()
+        self.written.append(session)
+
+    async def save_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        write = self.prepare_save(request, response, session)
+        await write
+
+    def prepare_save(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> Awaitable[None]:
+        self.save_cookie(response, "key", max_age=session.max_age)
+        return self._write(session)
+
+
+async def test_invalid_params() -> None:
+    with pytest.raises(ValueError):
+        DeferredWriter(max_pending=0)
+    with pytest.raises(ValueError):
+        DeferredWriter(workers=0)
+
+
+async def test_submit_inline_if_not_started() -> None:
+    writer = DeferredWriter()
+    done = []
+
+    async def write() -> None:
+        done.append(1)
+
+    await writer.submit(write())
+    assert done == [1]
+
+
+async def test_submit_waits_if_queue_full() -> None:
+    writer = DeferredWriter(max_pending=1, workers=1)
+    writer.start()
+    release = asyncio.Event()
+    done = []
+
+    async def write(n: int) -> None:
+        await release.wait()
+        done.append(n)
+
+    await writer.submit(write(1))
+    await asyncio.sleep(0)  # The worker takes the first write.
+    await writer.submit(write(2))
+    assert writer.pending == 1
+    task = asyncio.create_task(writer.submit(write(3)))
+    await asyncio.sleep(0)
+    assert not task.done()
+    release.set()
+    await task
+    await writer.close()
+    assert sorted(done) == [1, 2, 3]
+
+
+async def test_same_key_in_order() -> None:
+    writer = DeferredWriter(workers=4)
+    writer.start()
+    done = []
+
+    async def write(n: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        done.append(n)
+
+    # The older write is slower, it still lands first.
+    await writer.submit(write(1, 0.05), "key")
+    await writer.submit(write(2, 0), "key")
+    await writer.close()
+    assert done == [1, 2]
+
+
+async def test_start_twice() -> None:
+    writer = DeferredWriter()
+    writer.start()
+    with pytest.raises(RuntimeError):
+        writer.start()
+    await writer.close()
+
+
+async def test_failed_write_is_logged(caplog: pytest.LogCaptureFixture) -> None:
+    writer = DeferredWriter()
+    writer.start()
+
+    async def write() -> None:
+        raise ValueError("boom")
+
+    await writer.submit(write())
+    await writer.close()
+    assert "Deferred session save failed" in caplog.text
+
+
+async def test_deferred_save(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    storage = BackendStorage()
+    writer = DeferredWriter()
+    app = web.Application()
+    setup_middleware(app, storage, writer=writer)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+
+    async with client.get("/") as resp:
+        assert resp.status == 200
+        assert resp.cookies["AIOHTTP_SESSION"].value == "key"
+    # The response was sent before the backend write completed.
+    assert storage.written == []
+
+    storage.release.set()
+    await client.close()
+    assert len(storage.written) == 1
+    assert storage.written[0]["a"] == 1
+
+
+async def test_deferred_save_loaded_session(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert not session.new
+        session["b"] = 2
+        return web.Response(body=b"OK")
+
+    storage = BackendStorage()
+    writer = DeferredWriter()
+    app = web.Application()
+    setup_middleware(app, storage, writer=writer)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    value = json.dumps({"created": int(time.time()), "session": {"a": 1}})
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": value})
+
+    async with client.get("/") as resp:
+        assert resp.status == 200
+    # Modified keys of a loaded session are deferred too.
+    assert storage.written == []
+
+    storage.release.set()
+    await client.close()
+    assert len(storage.written) == 1
+    assert dict(storage.written[0]) == {"a": 1, "b": 2}
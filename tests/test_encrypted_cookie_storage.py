@@ -12,6 +12,7 @@ from aiohttp.typedefs import Handler
 from cryptography.fernet import Fernet
 
 from aiohttp_session import Session, get_session, new_session, session_middleware
+from aiohttp_session.compression import ZlibCompressor, compress_payload
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 
 from .typedefs import AiohttpClient
@@ -224,3 +225,69 @@ async def test_fernet_ttl(
     client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": cookie})
     resp = await client.get("/")
     assert await resp.text() == ""
+
+
+async def test_skip_unchanged(aiohttp_client: AiohttpClient, fernet: Fernet) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    middleware = session_middleware(EncryptedCookieStorage(fernet, skip_unchanged=True))
+    app = web.Application(middlewares=[middleware])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" in resp.cookies
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+
+
+async def test_compression(aiohttp_client: AiohttpClient, fernet: Fernet) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "n" in request.rel_url.query:
+            session["items"] = ["item"] * int(request.rel_url.query["n"])
+        return web.json_response(len(session.get("items", [])))
+
+    storage = EncryptedCookieStorage(
+        fernet, compressor=ZlibCompressor(), compress_threshold=100
+    )
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/?n=100")
+    cookie = resp.cookies["AIOHTTP_SESSION"].value
+    payload = fernet.decrypt(cookie.encode("utf-8"))
+    assert payload.startswith(b"\xff\x01")
+    assert len(payload) < 100
+    assert await (await client.get("/")).json() == 100
+
+    # Below the threshold, payloads are left uncompressed.
+    resp = await client.get("/?n=1")
+    cookie = resp.cookies["AIOHTTP_SESSION"].value
+    assert decrypt(fernet, cookie)["session"] == {"items": ["item"]}
+
+    # Sessions saved before compression was enabled still load.
+    client.session.cookie_jar.clear()
+    make_cookie(client, fernet, {"items": ["item"] * 50})
+    assert await (await client.get("/")).json() == 50
+
+
+async def test_compression_corrupted(
+    aiohttp_client: AiohttpClient, fernet: Fernet
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert session.new
+        return web.Response(body=b"OK")
+
+    client = await aiohttp_client(create_app(handler, fernet))
+    payload = compress_payload(b"x" * 100, ZlibCompressor())[:-5]
+    encrypted = fernet.encrypt(payload).decode("utf-8")
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": encrypted})
+    resp = await client.get("/")
+    assert resp.status == 200
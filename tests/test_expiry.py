@@ -0,0 +1,91 @@
+import asyncio
+import random
+
+import pytest
+
+from aiohttp_session.expiry import TimerWheel
+
+
+def make_wheel(**kwargs: int) -> TimerWheel[str]:
+    wheel: TimerWheel[str] = TimerWheel(**kwargs)
+    # Start at a known tick.
+    wheel._tick = 0
+    return wheel
+
+
+def test_invalid_params() -> None:
+    with pytest.raises(ValueError):
+        TimerWheel(resolution=0)
+    with pytest.raises(ValueError):
+        TimerWheel(slots=1)
+    with pytest.raises(ValueError):
+        TimerWheel(levels=0)
+
+
+def test_expire_in_order() -> None:
+    wheel = make_wheel(slots=4, levels=2)
+    wheel.schedule("a", 1)
+    wheel.schedule("b", 2.5)
+    wheel.schedule("c", 10)
+    assert len(wheel) == 3
+    assert wheel.advance(0.9) == []
+    assert wheel.advance(1) == ["a"]
+    # Deadlines are rounded up to ticks, keys never expire early.
+    assert wheel.advance(2.9) == []
+    assert wheel.advance(3) == ["b"]
+    assert wheel.advance(9) == []
+    assert wheel.advance(10) == ["c"]
+    assert len(wheel) == 0
+
+
+def test_past_deadline_expires_on_next_tick() -> None:
+    wheel = make_wheel()
+    wheel.schedule("a", -5)
+    assert wheel.advance(1) == ["a"]
+
+
+def test_reschedule_and_cancel() -> None:
+    wheel = make_wheel(slots=4, levels=2)
+    wheel.schedule("a", 2)
+    wheel.schedule("a", 6)
+    wheel.schedule("b", 3)
+    wheel.cancel("b")
+    wheel.cancel("missing")
+    assert "a" in wheel
+    assert "b" not in wheel
+    assert wheel.advance(5) == []
+    assert wheel.advance(6) == ["a"]
+
+
+@pytest.mark.parametrize("levels", [1, 2, 3])
+def test_matches_deadlines(levels: int) -> None:
+    rnd = random.Random(0)
+    wheel = make_wheel(slots=8, levels=levels)
+    deadlines = {f"k{n}": rnd.randint(1, 2000) for n in range(500)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    now = 0
+    while deadlines:
+        now += rnd.randint(1, 50)
+        expired = wheel.advance(now)
+        assert sorted(expired) == sorted(k for k, d in deadlines.items() if d <= now)
+        for key in expired:
+            del deadlines[key]
+        # Keys scheduled while the wheel turns are placed from its position.
+        key = f"late{now}"
+        if now < 1500:
+            deadlines[key] = now + rnd.randint(1, 500)
+            wheel.schedule(key, deadlines[key])
+    assert len(wheel) == 0
+
+
+async def test_run() -> None:
+    wheel: TimerWheel[str] = TimerWheel(resolution=0.01)
+    loop = asyncio.get_running_loop()
+    expired: list[str] = []
+    wheel.schedule("a", loop.time() + 0.02)
+    task = asyncio.create_task(wheel.run(expired.extend))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert expired == ["a"]
@@ -0,0 +1,43 @@
+from collections import Counter
+
+import pytest
+
+from aiohttp_session.hashring import HashRing
+
+KEYS = [f"AIOHTTP_SESSION_{n:08x}" for n in range(20000)]
+
+
+def test_invalid_params() -> None:
+    with pytest.raises(ValueError):
+        HashRing({"a": 1}, vnodes=0)
+    with pytest.raises(LookupError):
+        HashRing({}).get("key")
+
+
+def test_balanced() -> None:
+    ring = HashRing({name: name for name in "abcd"})
+    counts = Counter(ring.get(key) for key in KEYS)
+    assert set(counts) == set("abcd")
+    for count in counts.values():
+        assert abs(count - len(KEYS) / 4) < len(KEYS) / 4 * 0.2
+
+
+def test_stable() -> None:
+    first = HashRing({"a": 1, "b": 2, "c": 3})
+    second = HashRing({"c": 3, "a": 1, "b": 2})
+    assert [first.get(key) for key in KEYS] == [second.get(key) for key in KEYS]
+
+
+def test_add_moves_keys_to_new_node_only() -> None:
+    ring = HashRing({name: name for name in "abcd"})
+    before = {key: ring.get_name(key) for key in KEYS}
+    ring.add("e", "e")
+    assert len(ring) == 5
+    moved = [key for key in KEYS if ring.get_name(key) != before[key]]
+    assert all(ring.get_name(key) == "e" for key in moved)
+    assert abs(len(moved) - len(KEYS) / 5) < len(KEYS) / 5 * 0.2
+
+    ring.remove("e")
+    assert {key: ring.get_name(key) for key in KEYS} == before
+    with pytest.raises(ValueError):
+        ring.add("a", "a")
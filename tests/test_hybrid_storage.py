@@ -0,0 +1,97 @@
+import pytest
+from aiohttp import web
+from cryptography.fernet import Fernet
+
+from aiohttp_session import get_session, setup
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+from aiohttp_session.hybrid_storage import HybridStorage
+from aiohttp_session.memory_storage import InMemoryStorage
+
+from .typedefs import AiohttpClient
+
+SERVER_COOKIE = "AIOHTTP_SESSION_REF"
+
+
+async def handler(request: web.Request) -> web.StreamResponse:
+    session = await get_session(request)
+    if request.method == "POST":
+        session.clear()
+        session.update(await request.json())
+    return web.json_response(dict(session))
+
+
+def create_storage() -> HybridStorage:
+    return HybridStorage(
+        EncryptedCookieStorage(Fernet(Fernet.generate_key())),
+        InMemoryStorage(cookie_name=SERVER_COOKIE),
+        threshold=1000,
+    )
+
+
+def create_app(storage: HybridStorage) -> web.Application:
+    app = web.Application()
+    setup(app, storage)
+    app.router.add_route("*", "/", handler)
+    return app
+
+
+def test_invalid_params() -> None:
+    fernet = Fernet(Fernet.generate_key())
+    with pytest.raises(ValueError):
+        HybridStorage(EncryptedCookieStorage(fernet), InMemoryStorage())
+    with pytest.raises(ValueError):
+        HybridStorage(
+            EncryptedCookieStorage(fernet),
+            InMemoryStorage(cookie_name=SERVER_COOKIE),
+            threshold=0,
+        )
+
+
+async def test_small_session_in_cookie(aiohttp_client: AiohttpClient) -> None:
+    storage = create_storage()
+    server = storage.server_storage
+    assert isinstance(server, InMemoryStorage)
+    client = await aiohttp_client(create_app(storage))
+    resp = await client.post("/", json={"a": 1})
+    assert "AIOHTTP_SESSION" in resp.cookies
+    assert SERVER_COOKIE not in resp.cookies
+    assert len(server) == 0
+    resp = await client.get("/")
+    assert await resp.json() == {"a": 1}
+
+
+async def test_large_session_spills(aiohttp_client: AiohttpClient) -> None:
+    storage = create_storage()
+    server = storage.server_storage
+    assert isinstance(server, InMemoryStorage)
+    client = await aiohttp_client(create_app(storage))
+    await client.post("/", json={"a": 1})
+
+    large = {"data": "x" * 2000}
+    resp = await client.post("/", json=large)
+    # The cookie sent before is dropped, only the reference is kept.
+    assert resp.cookies["AIOHTTP_SESSION"].value == ""
+    assert len(resp.cookies[SERVER_COOKIE].value) == 32
+    assert len(server) == 1
+    resp = await client.get("/")
+    assert await resp.json() == large
+    resp = await client.post("/", json=dict(large, b=2))
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert len(server) == 1
+
+    # Back in the cookie once it is small again.
+    resp = await client.post("/", json={"a": 2})
+    assert resp.cookies[SERVER_COOKIE].value == ""
+    assert resp.cookies["AIOHTTP_SESSION"].value
+    assert len(server) == 0
+    resp = await client.get("/")
+    assert await resp.json() == {"a": 2}
+
+
+async def test_new_large_session(aiohttp_client: AiohttpClient) -> None:
+    client = await aiohttp_client(create_app(create_storage()))
+    resp = await client.post("/", json={"data": "x" * 2000})
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert SERVER_COOKIE in resp.cookies
+    resp = await client.get("/")
+    assert await resp.json() == {"data": "x" * 2000}
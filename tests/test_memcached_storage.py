@@ -6,11 +6,15 @@ from collections.abc import Callable, MutableMapping
 from typing import Any, cast
 
 import aiomcache
+import pytest
 from aiohttp import web
 from aiohttp.test_utils import TestClient
 from aiohttp.typedefs import Handler
+from pytest_mock import MockFixture
 
 from aiohttp_session import Session, get_session, session_middleware
+from aiohttp_session.cache import SessionCache
+from aiohttp_session.compression import MAGIC, ZlibCompressor, decompress_payload
 from aiohttp_session.memcached_storage import MemcachedStorage
 
 from .typedefs import AiohttpClient
@@ -313,3 +317,231 @@ async def test_memcached_max_age_over_30_days(
 
     resp_content = await resp.text()
     assert resp_content == "TEST_VALUE"
+
+
+async def test_lazy_decode(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert decode.call_count == 0
+        if "read" in request.rel_url.query:
+            assert session["a"] == 1
+            assert decode.call_count == 1
+        return web.Response(body=b"OK")
+
+    storage = MemcachedStorage(memcached, lazy_decode=True)
+    decode = mocker.spy(storage, "_decode_session_data")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, memcached, {"a": 1, "b": 2})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert decode.call_count == 0
+
+    resp = await client.get("/?read=1")
+    assert resp.status == 200
+    assert decode.call_count == 1
+
+
+async def test_skip_unchanged(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    storage = MemcachedStorage(memcached, lazy_decode=True, skip_unchanged=True)
+    save = mocker.spy(storage, "save_session")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" in resp.cookies
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert save.call_count == 1
+
+
+async def test_sliding_expiry(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert cast(MutableMapping[str, Any], {"a": 1}) == session
+        return web.Response(body=b"OK")
+
+    storage = MemcachedStorage(memcached, max_age=10, sliding_expiry=0.5)
+    refresh = mocker.spy(storage, "refresh_session")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    # Written long ago, kept alive by refreshes since.
+    key = uuid.uuid4().hex
+    value = json.dumps({"created": int(time.time()) - 100, "session": {"a": 1}})
+    await memcached.set(("AIOHTTP_SESSION_" + key).encode(), value.encode())
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": key})
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert resp.cookies["AIOHTTP_SESSION"].value == key
+    assert refresh.call_count == 1
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert refresh.call_count == 1
+
+
+async def test_coalesce_loads(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert session["a"] == 1
+        # Sessions are not shared between requests.
+        session["a"] = 2
+        return web.Response(body=b"OK")
+
+    calls = 0
+    get = memcached.get
+
+    async def counting_get(key: bytes) -> bytes | None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return await get(key)
+
+    storage = MemcachedStorage(memcached, coalesce_loads=True)
+    mocker.patch.object(memcached, "get", counting_get)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, memcached, {"a": 1})
+    responses = await asyncio.gather(*(client.get("/") for _ in range(5)))
+    assert all(resp.status == 200 for resp in responses)
+    assert calls < 5
+
+
+async def test_cache(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.Response(body=str(session["n"]).encode())
+
+    calls = 0
+    get = memcached.get
+
+    async def counting_get(key: bytes) -> bytes | None:
+        nonlocal calls
+        calls += 1
+        return await get(key)
+
+    storage = MemcachedStorage(memcached, cache=SessionCache())
+    mocker.patch.object(memcached, "get", counting_get)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, memcached, {"n": 1})
+    for n in range(2, 5):
+        resp = await client.get("/")
+        assert await resp.text() == str(n)
+    # Saves write through, only the first load reaches memcached.
+    assert calls == 1
+    value = await load_cookie(client, memcached)
+    assert value["session"] == {"n": 4}
+
+
+async def test_cache_with_sliding_expiry(memcached: aiomcache.Client) -> None:
+    with pytest.raises(ValueError):
+        MemcachedStorage(
+            memcached, max_age=60, sliding_expiry=0.5, cache=SessionCache()
+        )
+
+
+@pytest.mark.parametrize("cache", [None, SessionCache()])
+async def test_compare_and_set(
+    aiohttp_client: AiohttpClient,
+    memcached: aiomcache.Client,
+    cache: SessionCache | None,
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        # A concurrent request saves the session meanwhile.
+        stored_key = ("AIOHTTP_SESSION_" + str(session.identity)).encode("utf-8")
+        value = {"created": session.created, "session": {"a": 1, "c": 3}}
+        await memcached.set(stored_key, json.dumps(value).encode("utf-8"))
+        return web.Response(body=b"OK")
+
+    storage = MemcachedStorage(memcached, compare_and_set=True, cache=cache)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, memcached, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    value = await load_cookie(client, memcached)
+    assert value["session"] == {"a": 1, "b": 2, "c": 3}
+
+
+async def test_compare_and_set_expired(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        await memcached.delete(
+            ("AIOHTTP_SESSION_" + str(session.identity)).encode("utf-8")
+        )
+        return web.Response(body=b"OK")
+
+    storage = MemcachedStorage(memcached, compare_and_set=True)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, memcached, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    value = await load_cookie(client, memcached)
+    assert value["session"] == {"a": 1, "b": 2}
+
+
+async def test_compression(
+    aiohttp_client: AiohttpClient, memcached: aiomcache.Client
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "size" in request.query:
+            session["data"] = "x" * int(request.query["size"])
+        return web.json_response(dict(session))
+
+    storage = MemcachedStorage(
+        memcached, compressor=ZlibCompressor(), compress_threshold=100
+    )
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/", params={"size": "1000"})
+    assert resp.status == 200
+    cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+    stored_key = "AIOHTTP_SESSION_" + cookies["AIOHTTP_SESSION"].value
+    value = await memcached.get(stored_key.encode("utf-8"))
+    assert value is not None
+    assert value.startswith(MAGIC)
+    assert json.loads(decompress_payload(value))["session"] == {"data": "x" * 1000}
+    resp = await client.get("/")
+    assert await resp.json() == {"data": "x" * 1000}
+
+    # Values stored before compression was enabled still load.
+    client.session.cookie_jar.clear()
+    await make_cookie(client, memcached, {"data": "y" * 1000})
+    resp = await client.get("/")
+    assert await resp.json() == {"data": "y" * 1000}
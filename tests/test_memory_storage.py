@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+from aiohttp import web
+from pytest_mock import MockFixture
+
+from aiohttp_session import get_session, setup
+from aiohttp_session.memory_storage import InMemoryStorage
+
+from .typedefs import AiohttpClient
+
+
+async def handler(request: web.Request) -> web.StreamResponse:
+    session = await get_session(request)
+    if request.method == "POST":
+        session.update(await request.json())
+    elif request.method == "DELETE":
+        session.invalidate()
+    return web.json_response(dict(session))
+
+
+def create_app(storage: InMemoryStorage) -> web.Application:
+    app = web.Application()
+    setup(app, storage)
+    app.router.add_route("*", "/", handler)
+    return app
+
+
+def test_invalid_params() -> None:
+    with pytest.raises(ValueError):
+        InMemoryStorage(max_entries=0)
+    with pytest.raises(ValueError):
+        InMemoryStorage(max_bytes=0)
+
+
+async def test_save_and_load(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage()
+    client = await aiohttp_client(create_app(storage))
+    resp = await client.get("/")
+    assert await resp.json() == {}
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert len(storage) == 0
+
+    resp = await client.post("/", json={"a": 1, "nested": {"b": [1, 2]}})
+    assert len(storage) == 1
+    assert storage.size > 0
+    resp = await client.get("/")
+    assert await resp.json() == {"a": 1, "nested": {"b": [1, 2]}}
+
+
+async def test_load_returns_copy(aiohttp_client: AiohttpClient) -> None:
+    async def mutate(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        # In-place mutation without changed() isn't saved.
+        session["nested"]["b"].append(3)
+        return web.Response(body=b"OK")
+
+    storage = InMemoryStorage()
+    app = create_app(storage)
+    app.router.add_get("/mutate", mutate)
+    client = await aiohttp_client(app)
+    await client.post("/", json={"nested": {"b": [1, 2]}})
+    await client.get("/mutate")
+    resp = await client.get("/")
+    assert await resp.json() == {"nested": {"b": [1, 2]}}
+
+
+async def test_invalidate(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage()
+    client = await aiohttp_client(create_app(storage))
+    await client.post("/", json={"a": 1})
+    resp = await client.delete("/")
+    assert resp.cookies["AIOHTTP_SESSION"].value == ""
+    assert len(storage) == 0
+    assert storage.size == 0
+
+
+async def test_delta_keeps_concurrent_changes(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage()
+    client = await aiohttp_client(create_app(storage))
+    await client.post("/", json={"a": 1})
+    key = client.session.cookie_jar.filter_cookies(client.make_url("/"))[
+        "AIOHTTP_SESSION"
+    ].value
+    # Another request of the client stored a key meanwhile.
+    storage._entries[key].data["other"] = 2
+    await client.post("/", json={"b": 3})
+    resp = await client.get("/")
+    assert await resp.json() == {"a": 1, "b": 3, "other": 2}
+
+
+async def test_max_age(aiohttp_client: AiohttpClient, mocker: MockFixture) -> None:
+    now = time.monotonic()
+    monotonic = mocker.patch(
+        "aiohttp_session.memory_storage.time.monotonic", return_value=now
+    )
+    storage = InMemoryStorage(max_age=10)
+    client = await aiohttp_client(create_app(storage))
+    await client.post("/", json={"a": 1})
+    monotonic.return_value = now + 5
+    resp = await client.get("/")
+    assert await resp.json() == {"a": 1}
+    monotonic.return_value = now + 10
+    resp = await client.get("/")
+    assert await resp.json() == {}
+    assert len(storage) == 0
+
+
+async def test_lru_eviction_by_entries(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage(max_entries=2)
+    app = create_app(storage)
+    clients = [await aiohttp_client(app) for _ in range(3)]
+    await clients[0].post("/", json={"n": 0})
+    await clients[1].post("/", json={"n": 1})
+    # Loading makes the first session the most recently used.
+    await clients[0].get("/")
+    await clients[2].post("/", json={"n": 2})
+    assert len(storage) == 2
+    results: list[Any] = [await (await c.get("/")).json() for c in clients]
+    assert results == [{"n": 0}, {}, {"n": 2}]
+
+
+async def test_lru_eviction_by_bytes(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage(max_bytes=3000)
+    app = create_app(storage)
+    first = await aiohttp_client(app)
+    second = await aiohttp_client(app)
+    await first.post("/", json={"data": "x" * 1000})
+    await second.post("/", json={"data": "y" * 1000})
+    assert len(storage) == 2
+    await second.post("/", json={"more": "z" * 1000})
+    assert len(storage) == 1
+    assert storage.size <= 3000
+    assert await (await first.get("/")).json() == {}
+
+    # A session larger than max_bytes isn't kept, others are left alone.
+    await first.post("/", json={"data": "x" * 5000})
+    assert len(storage) == 1
+    assert await (await first.get("/")).json() == {}
+    assert await (await second.get("/")).json() == {
+        "data": "y" * 1000,
+        "more": "z" * 1000,
+    }
+
+
+async def test_expiry_ctx(aiohttp_client: AiohttpClient) -> None:
+    storage = InMemoryStorage(max_age=1)
+    app = create_app(storage)
+    app.cleanup_ctx.append(storage.expiry_ctx)
+    client = await aiohttp_client(app)
+    await client.post("/", json={"a": 1})
+    assert len(storage) == 1
+    for _ in range(40):
+        await asyncio.sleep(0.1)
+        if not storage:
+            break
+    # Dropped without being accessed again.
+    assert len(storage) == 0
+    assert len(storage._wheel) == 0
+
+
+async def test_expire(aiohttp_client: AiohttpClient, mocker: MockFixture) -> None:
+    now = time.monotonic()
+    monotonic = mocker.patch(
+        "aiohttp_session.memory_storage.time.monotonic", return_value=now
+    )
+    storage = InMemoryStorage(max_age=10)
+    client = await aiohttp_client(create_app(storage))
+    await client.post("/", json={"a": 1})
+    await client.post("/", json={"b": 1})
+    assert len(storage._wheel) == 1
+    monotonic.return_value = now + 5
+    storage.expire()
+    assert len(storage) == 1
+    monotonic.return_value = now + 11
+    storage.expire()
+    assert len(storage) == 0
+    assert storage.size == 0
@@ -0,0 +1,125 @@
+from aiohttp import web
+from cryptography.fernet import Fernet
+
+from aiohttp_session import SimpleCookieStorage, get_session, session_middleware
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+from aiohttp_session.metrics import PrometheusCollector, SessionObserver
+
+from .test_abstract_storage import make_cookie
+from .typedefs import AiohttpClient
+
+
+class RecordingObserver(SessionObserver):
+    def __init__(self) -> None:
+        self.events: list[tuple[object, ...]] = []
+
+    def on_load(self, storage: object, duration: float, new: bool) -> None:
+        assert duration >= 0
+        self.events.append(("load", new))
+
+    def on_save(self, storage: object, duration: float) -> None:
+        assert duration >= 0
+        self.events.append(("save",))
+
+    def on_payload(self, storage: object, operation: str, size: int) -> None:
+        self.events.append(("payload", operation, size))
+
+    def on_decode_error(self, storage: object) -> None:
+        self.events.append(("decode_error",))
+
+
+async def handler(request: web.Request) -> web.StreamResponse:
+    session = await get_session(request)
+    session["a"] = request.rel_url.query.get("a", "1")
+    return web.Response(body=b"OK")
+
+
+async def test_observer(aiohttp_client: AiohttpClient) -> None:
+    observer = RecordingObserver()
+    storage = SimpleCookieStorage(observer=observer)
+    assert storage.observer is observer
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    cookie = resp.cookies["AIOHTTP_SESSION"].value
+    assert observer.events == [
+        ("load", True),
+        ("payload", "save", len(cookie)),
+        ("save",),
+    ]
+
+    observer.events.clear()
+    make_cookie(client, {"a": "1"})
+    resp = await client.get("/?a=2")
+    assert resp.status == 200
+    assert [event[0] for event in observer.events] == [
+        "payload",
+        "load",
+        "payload",
+        "save",
+    ]
+    assert observer.events[1] == ("load", False)
+
+
+async def test_observer_decode_error(aiohttp_client: AiohttpClient) -> None:
+    observer = RecordingObserver()
+    storage = EncryptedCookieStorage(Fernet(Fernet.generate_key()), observer=observer)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": "invalid"})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert ("decode_error",) in observer.events
+    assert ("load", True) in observer.events
+
+
+async def test_prometheus_collector(aiohttp_client: AiohttpClient) -> None:
+    collector = PrometheusCollector()
+    storage = SimpleCookieStorage(observer=collector)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    app.router.add_route("GET", "/metrics", collector.handler)
+    client = await aiohttp_client(app)
+    for _ in range(3):
+        resp = await client.get("/")
+        assert resp.status == 200
+
+    resp = await client.get("/metrics")
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = await resp.text()
+    lines = text.splitlines()
+    assert "# TYPE aiohttp_session_operation_duration_seconds histogram" in lines
+    labels = 'storage="SimpleCookieStorage",operation="save"'
+    assert f"aiohttp_session_operation_duration_seconds_count{{{labels}}} 3" in lines
+    assert (
+        f'aiohttp_session_operation_duration_seconds_bucket{{{labels},le="+Inf"}} 3'
+        in lines
+    )
+    assert f"aiohttp_session_payload_size_bytes_count{{{labels}}} 3" in lines
+    # The cookie of the first response is sent back by later requests.
+    assert (
+        'aiohttp_session_loads_total{storage="SimpleCookieStorage",new="true"} 1'
+        in lines
+    )
+    assert (
+        'aiohttp_session_loads_total{storage="SimpleCookieStorage",new="false"} 2'
+        in lines
+    )
+
+
+def test_prometheus_histogram_buckets() -> None:
+    collector = PrometheusCollector(latency_buckets=(0.1, 1))
+    storage = SimpleCookieStorage()
+    for duration in (0.05, 0.1, 0.5, 2):
+        collector.on_refresh(storage, duration)
+    lines = collector.render().splitlines()
+    name = "aiohttp_session_operation_duration_seconds"
+    labels = 'storage="SimpleCookieStorage",operation="refresh"'
+    assert f'{name}_bucket{{{labels},le="0.1"}} 2' in lines
+    assert f'{name}_bucket{{{labels},le="1.0"}} 3' in lines
+    assert f'{name}_bucket{{{labels},le="+Inf"}} 4' in lines
+    assert f"{name}_sum{{{labels}}} 2.65" in lines
@@ -13,6 +13,7 @@ from aiohttp.typedefs import Handler
 from nacl.encoding import Base64Encoder
 
 from aiohttp_session import Session, get_session, new_session, session_middleware
+from aiohttp_session.compression import ZlibCompressor
 from aiohttp_session.nacl_storage import NaClCookieStorage
 
 from .typedefs import AiohttpClient
@@ -253,3 +254,48 @@ async def test_load_expired_session(aiohttp_client: AiohttpClient, key: bytes) -
     client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": cookie})
     resp = await client.get("/")
     assert await resp.text() == ""
+
+
+async def test_skip_unchanged(
+    aiohttp_client: AiohttpClient, secretbox: nacl.secret.SecretBox, key: bytes
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    middleware = session_middleware(NaClCookieStorage(key, skip_unchanged=True))
+    app = web.Application(middlewares=[middleware])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" in resp.cookies
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+
+
+async def test_compression(
+    aiohttp_client: AiohttpClient, secretbox: nacl.secret.SecretBox, key: bytes
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "n" in request.rel_url.query:
+            session["items"] = ["item"] * int(request.rel_url.query["n"])
+        return web.json_response(len(session.get("items", [])))
+
+    storage = NaClCookieStorage(key, compressor=ZlibCompressor())
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/?n=100")
+    cookie = resp.cookies["AIOHTTP_SESSION"].value
+    payload = secretbox.decrypt(cookie.encode("utf-8"), encoder=Base64Encoder)
+    assert payload.startswith(b"\xff\x01")
+    assert await (await client.get("/")).json() == 100
+
+    client.session.cookie_jar.clear()
+    make_cookie(client, secretbox, {"items": ["item"] * 50})
+    assert await (await client.get("/")).json() == 50
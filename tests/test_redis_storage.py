@@ -4,7 +4,7 @@ import asyncio
 import json
 import time
 import uuid
-from collections.abc import Callable, MutableMapping
+from collections.abc import AsyncIterator, Callable, Mapping, MutableMapping
 from typing import Any, cast
 
 import pytest
@@ -13,9 +13,20 @@ from aiohttp.test_utils import TestClient
 from aiohttp.typedefs import Handler
 from pytest_mock import MockFixture
 from redis import asyncio as aioredis
-
-from aiohttp_session import Session, get_session, session_middleware
-from aiohttp_session.redis_storage import RedisStorage
+from redis.crc import key_slot
+
+from aiohttp_session import Session, get_session, session_middleware, setup
+from aiohttp_session.cache import SessionCache
+from aiohttp_session.codecs import MsgpackCodec
+from aiohttp_session.compression import (
+    MAGIC,
+    ZlibCompressor,
+    compress_payload,
+    decompress_payload,
+)
+from aiohttp_session.deferred import DeferredWriter
+from aiohttp_session.metrics import PrometheusCollector, SessionObserver
+from aiohttp_session.redis_storage import RedisStorage, ShardedRedisStorage
 
 from .typedefs import AiohttpClient
 
@@ -349,3 +360,598 @@ async def test_load_session_dont_load_expired_session(
 
     resp = await client.get("/?exp=yes")
     assert resp.status == 200
+
+
+@pytest.mark.parametrize("observer", [None, SessionObserver()])
+async def test_lazy_decode(
+    aiohttp_client: AiohttpClient,
+    redis: aioredis.Redis,
+    mocker: MockFixture,
+    observer: SessionObserver | None,
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert decode.call_count == 0
+        if "read" in request.rel_url.query:
+            assert session["a"] == 1
+            assert decode.call_count == 1
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, lazy_decode=True, observer=observer)
+    decode = mocker.spy(storage, "_decode_session_data")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1, "b": 2})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert decode.call_count == 0
+
+    resp = await client.get("/?read=1")
+    assert resp.status == 200
+    assert decode.call_count == 1
+
+
+async def test_skip_unchanged(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, lazy_decode=True, skip_unchanged=True)
+    save = mocker.spy(storage, "save_session")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" in resp.cookies
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert save.call_count == 1
+
+
+async def test_sliding_expiry(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert cast(MutableMapping[str, Any], {"a": 1}) == session
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, max_age=10, sliding_expiry=0.5)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    # Written long ago, kept alive by refreshes since.
+    value = json.dumps({"created": int(time.time()) - 100, "session": {"a": 1}})
+    await redis.set("AIOHTTP_SESSION_key", value, ex=9)
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": "key"})
+
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "AIOHTTP_SESSION" not in resp.cookies
+    assert await redis.ttl("AIOHTTP_SESSION_key") <= 9
+
+    await redis.expire("AIOHTTP_SESSION_key", 3)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert resp.cookies["AIOHTTP_SESSION"].value == "key"
+    assert await redis.ttl("AIOHTTP_SESSION_key") > 9
+    assert await redis.get("AIOHTTP_SESSION_key") == value.encode()
+
+
+async def test_sliding_expiry_requires_max_age(redis: aioredis.Redis) -> None:
+    with pytest.raises(ValueError):
+        RedisStorage(redis, sliding_expiry=0.5)
+    with pytest.raises(ValueError):
+        RedisStorage(redis, max_age=10, sliding_expiry=2)
+
+
+async def test_deferred_save(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    writer = DeferredWriter()
+    submit = mocker.spy(writer, "submit")
+    app = web.Application()
+    setup(app, RedisStorage(redis), writer=writer)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    key = resp.cookies["AIOHTTP_SESSION"].value
+    # The write of a new session is routed by its new key.
+    assert submit.call_args.args[1] == key
+
+    await client.close()
+    value = json.loads(await redis.get("AIOHTTP_SESSION_" + key))
+    assert value["session"] == {"a": 1}
+
+
+async def test_deferred_save_loaded_session(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        return web.Response(body=b"OK")
+
+    writer = DeferredWriter()
+    submit = mocker.spy(writer, "submit")
+    storage = RedisStorage(redis)
+    save_delta = mocker.spy(storage, "save_session_delta")
+    app = web.Application()
+    setup(app, storage, writer=writer)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert submit.call_count == 1
+    assert save_delta.call_count == 0
+    cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+    key = cookies["AIOHTTP_SESSION"].value
+
+    await client.close()
+    value = json.loads(await redis.get("AIOHTTP_SESSION_" + key))
+    assert value["session"] == {"a": 1, "b": 2}
+
+
+async def test_batch_writes(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = request.rel_url.query["n"]
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, batch_window=0.05)
+    assert storage._batcher is not None
+    write_batch = mocker.spy(storage._batcher, "_flush")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    responses = await asyncio.gather(*(client.get(f"/?n={n}") for n in range(5)))
+    assert write_batch.call_count == 1
+    for n, resp in enumerate(responses):
+        assert resp.status == 200
+        client.session.cookie_jar.clear()
+        client.session.cookie_jar.update_cookies(
+            {"AIOHTTP_SESSION": resp.cookies["AIOHTTP_SESSION"].value}
+        )
+        value = await load_cookie(client, redis)
+        assert value["session"] == {"n": str(n)}
+
+
+async def test_coalesce_loads(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert session["a"] == 1
+        # Sessions are not shared between requests.
+        session["a"] = 2
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, coalesce_loads=True)
+    fetch = mocker.spy(storage, "_fetch")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    responses = await asyncio.gather(*(client.get("/") for _ in range(5)))
+    assert all(resp.status == 200 for resp in responses)
+    assert fetch.call_count < 5
+
+
+async def test_cache(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis, mocker: MockFixture
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.Response(body=str(session["n"]).encode())
+
+    cache = SessionCache()
+    storage = RedisStorage(redis, cache=cache)
+    fetch = mocker.spy(storage, "_fetch")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"n": 1})
+    for n in range(2, 5):
+        resp = await client.get("/")
+        assert await resp.text() == str(n)
+    # Saves write through, only the first load reaches Redis.
+    assert fetch.call_count == 1
+    value = await load_cookie(client, redis)
+    assert value["session"] == {"n": 4}
+
+
+async def test_cache_with_sliding_expiry(redis: aioredis.Redis) -> None:
+    with pytest.raises(ValueError):
+        RedisStorage(redis, max_age=60, sliding_expiry=0.5, cache=SessionCache())
+
+
+async def test_cache_invalidation(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "n" in request.rel_url.query:
+            session["n"] = request.rel_url.query["n"]
+        return web.Response(body=session["n"].encode())
+
+    caches = [SessionCache(), SessionCache()]
+    clients = []
+    for cache in caches:
+        storage = RedisStorage(redis, cache=cache, invalidation_channel="sessions")
+        app = web.Application(middlewares=[session_middleware(storage)])
+        app.cleanup_ctx.append(storage.invalidation_ctx)
+        app.router.add_route("GET", "/", handler)
+        clients.append(await aiohttp_client(app))
+    first, second = clients
+    await asyncio.sleep(0.05)
+
+    await make_cookie(first, redis, {"n": "1"})
+    second.session.cookie_jar.update_cookies(
+        first.session.cookie_jar.filter_cookies(first.make_url("/"))
+    )
+    resp = await second.get("/")
+    assert await resp.text() == "1"
+    resp = await first.get("/?n=2")
+    assert await resp.text() == "2"
+    for _ in range(100):
+        if not caches[1]:
+            break
+        await asyncio.sleep(0.01)
+    # The writer keeps its own entry.
+    assert caches[0]
+    resp = await second.get("/")
+    assert await resp.text() == "2"
+
+
+async def test_invalidation_ctx_requires_cache(redis: aioredis.Redis) -> None:
+    storage = RedisStorage(redis, cache=SessionCache())
+    with pytest.raises(RuntimeError):
+        await storage.invalidation_ctx(web.Application()).__anext__()
+
+
+async def test_compare_and_set(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        # A concurrent request saves the session meanwhile.
+        stored_key = "AIOHTTP_SESSION_" + str(session.identity)
+        value = {"created": session.created, "session": {"a": 1, "c": 3}}
+        await redis.set(stored_key, json.dumps(value))
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, compare_and_set=True)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    value = await load_cookie(client, redis)
+    assert value["session"] == {"a": 1, "b": 2, "c": 3}
+
+
+async def test_compare_and_set_after_invalidation(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        await redis.set("AIOHTTP_SESSION_" + str(session.identity), "{}")
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, compare_and_set=True)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert await load_cookie(client, redis) == {}
+
+
+async def test_compare_and_set_conflict_handler(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 2
+        stored_key = "AIOHTTP_SESSION_" + str(session.identity)
+        value = {"created": session.created, "session": {"a": 3}}
+        await redis.set(stored_key, json.dumps(value))
+        return web.Response(body=b"OK")
+
+    conflicts = []
+
+    def on_conflict(
+        base: Mapping[str, Any], ours: Mapping[str, Any], theirs: Mapping[str, Any]
+    ) -> None:
+        conflicts.append((base, ours, theirs))
+
+    storage = RedisStorage(redis, compare_and_set=True, on_conflict=on_conflict)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert conflicts == [({"a": 1}, {"a": 2}, {"a": 3})]
+    value = await load_cookie(client, redis)
+    assert value["session"] == {"a": 3}
+
+
+async def test_compare_and_set_with_batch_window(redis: aioredis.Redis) -> None:
+    with pytest.raises(ValueError):
+        RedisStorage(redis, compare_and_set=True, batch_window=0.01)
+
+
+async def test_observer(aiohttp_client: AiohttpClient, redis: aioredis.Redis) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.Response(body=b"OK")
+
+    collector = PrometheusCollector()
+    storage = RedisStorage(redis, cache=SessionCache(), observer=collector)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"n": 1})
+    for _ in range(3):
+        resp = await client.get("/")
+        assert resp.status == 200
+    lines = collector.render().splitlines()
+    name = "aiohttp_session_cache_lookups_total"
+    assert f'{name}{{storage="RedisStorage",result="miss"}} 1' in lines
+    assert f'{name}{{storage="RedisStorage",result="hit"}} 2' in lines
+    name = "aiohttp_session_payload_size_bytes_count"
+    assert f'{name}{{storage="RedisStorage",operation="load"}} 3' in lines
+    assert f'{name}{{storage="RedisStorage",operation="save"}} 3' in lines
+
+
+async def test_server_timing(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 2
+        return web.Response(body=b"OK")
+
+    middleware = session_middleware(RedisStorage(redis), server_timing=True)
+    app = web.Application(middlewares=[middleware])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    header = resp.headers["Server-Timing"]
+    for name in ("cookie", "fetch", "decode", "encode", "set_cookie", "store"):
+        assert f"session-{name};dur=" in header
+
+
+@pytest.fixture
+async def shards(redis_url: str) -> AsyncIterator[dict[str, aioredis.Redis]]:
+    clients = {
+        f"db{db}": aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(redis_url, db=db)
+        )
+        for db in (1, 2, 3)
+    }
+    yield clients
+    for client in clients.values():
+        await client.aclose()
+
+
+@pytest.mark.parametrize("batch_window", [None, 0.01])
+async def test_sharded_storage(
+    aiohttp_client: AiohttpClient,
+    shards: dict[str, aioredis.Redis],
+    batch_window: float | None,
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "n" in request.rel_url.query:
+            session["n"] = request.rel_url.query["n"]
+        return web.Response(body=session["n"].encode())
+
+    storage = ShardedRedisStorage(shards, batch_window=batch_window)
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    clients = [await aiohttp_client(app) for _ in range(12)]
+    await asyncio.gather(*(c.get(f"/?n={n}") for n, c in enumerate(clients)))
+    used = set()
+    for n, client in enumerate(clients):
+        resp = await client.get("/")
+        assert await resp.text() == str(n)
+        cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+        stored_key = "AIOHTTP_SESSION_" + cookies["AIOHTTP_SESSION"].value
+        name = storage.ring.get_name(stored_key)
+        used.add(name)
+        for shard_name, shard in shards.items():
+            assert await shard.exists(stored_key) == (shard_name == name)
+    assert len(used) > 1
+
+
+async def test_sharded_storage_invalid_shards(redis: aioredis.Redis) -> None:
+    with pytest.raises(ValueError):
+        ShardedRedisStorage({})
+    with pytest.raises(TypeError):
+        ShardedRedisStorage({"a": redis, "b": object()})  # type: ignore[dict-item]
+
+
+async def test_hash_tag(aiohttp_client: AiohttpClient, redis: aioredis.Redis) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, hash_tag=True, key_factory=lambda: "abc")
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert storage.stored_key("abc") == "AIOHTTP_SESSION_{abc}"
+    value = json.loads(await redis.get("AIOHTTP_SESSION_{abc}"))
+    assert value["session"] == {"a": 1}
+    # Related keys with the same tag share the slot of the session.
+    assert key_slot(b"AIOHTTP_SESSION_{abc}") == key_slot(b"user:{abc}:index")
+    assert RedisStorage(redis).stored_key("abc") == "AIOHTTP_SESSION_abc"
+
+
+async def test_cluster_client() -> None:
+    # The client doesn't connect before the first command.
+    cluster = aioredis.RedisCluster(host="127.0.0.1", port=7000)
+    storage = RedisStorage(cluster, hash_tag=True, batch_window=0.01)
+    assert storage._client(storage.stored_key("abc")) is cluster
+    with pytest.raises(ValueError):
+        RedisStorage(cluster, cache=SessionCache(), invalidation_channel="sessions")
+    with pytest.raises(ValueError):
+        RedisStorage(cluster, compare_and_set=True)
+    await cluster.aclose()
+
+
+async def test_compression(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        if "size" in request.query:
+            session["data"] = "x" * int(request.query["size"])
+        return web.json_response(dict(session))
+
+    storage = RedisStorage(
+        redis, compressor=ZlibCompressor(), compress_threshold=100, skip_unchanged=True
+    )
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/", params={"size": "1000"})
+    assert resp.status == 200
+    cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+    stored_key = "AIOHTTP_SESSION_" + cookies["AIOHTTP_SESSION"].value
+    value = await redis.get(stored_key)
+    assert value.startswith(MAGIC)
+    assert len(value) < 100
+    assert json.loads(decompress_payload(value))["session"] == {"data": "x" * 1000}
+    resp = await client.get("/")
+    assert await resp.json() == {"data": "x" * 1000}
+    # Compressed sessions are compared uncompressed.
+    assert "AIOHTTP_SESSION" not in resp.cookies
+
+    # Below the threshold, values are left uncompressed.
+    resp = await client.get("/", params={"size": "10"})
+    assert (await load_cookie(client, redis))["session"] == {"data": "x" * 10}
+
+    # Values stored before compression was enabled still load.
+    client.session.cookie_jar.clear()
+    await make_cookie(client, redis, {"data": "y" * 1000})
+    resp = await client.get("/")
+    assert await resp.json() == {"data": "y" * 1000}
+
+
+async def test_compression_corrupted(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        assert cast(MutableMapping[str, Any], {}) == session
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(redis, compressor=ZlibCompressor())
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    key = uuid.uuid4().hex
+    payload = compress_payload(b"x" * 100, ZlibCompressor())[:-5]
+    await redis.set("AIOHTTP_SESSION_" + key, payload)
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": key})
+    resp = await client.get("/")
+    assert resp.status == 200
+
+
+async def test_compression_compare_and_set(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["b"] = 2
+        # A concurrent request saves the session meanwhile.
+        stored_key = "AIOHTTP_SESSION_" + str(session.identity)
+        value = {"created": session.created, "session": {"a": "x" * 500, "c": 3}}
+        await redis.set(
+            stored_key,
+            compress_payload(json.dumps(value).encode("utf-8"), ZlibCompressor()),
+        )
+        return web.Response(body=b"OK")
+
+    storage = RedisStorage(
+        redis, compare_and_set=True, compressor=ZlibCompressor(), compress_threshold=0
+    )
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    await make_cookie(client, redis, {"a": "x" * 500})
+    resp = await client.get("/")
+    assert resp.status == 200
+    cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+    value = await redis.get("AIOHTTP_SESSION_" + cookies["AIOHTTP_SESSION"].value)
+    assert value.startswith(MAGIC)
+    assert json.loads(decompress_payload(value))["session"] == {
+        "a": "x" * 500,
+        "b": 2,
+        "c": 3,
+    }
+
+
+async def test_sample_payloads(redis: aioredis.Redis) -> None:
+    # The database is shared with other tests, only these keys match.
+    name = "S" + uuid.uuid4().hex
+    storage = RedisStorage(redis, cookie_name=name, compressor=ZlibCompressor())
+    value = json.dumps({"created": 1, "session": {"a": "x" * 500}}).encode("utf-8")
+    await redis.set(name + "_a", value)
+    await redis.set(name + "_b", compress_payload(value, ZlibCompressor()))
+    await redis.set("OTHER_" + name, value)
+    assert await storage.sample_payloads() == [value, value]
+    assert len(await storage.sample_payloads(1)) == 1
+
+
+async def test_binary_codec(
+    aiohttp_client: AiohttpClient, redis: aioredis.Redis
+) -> None:
+    msgpack = pytest.importorskip("msgpack")
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["n"] = session.get("n", 0) + 1
+        return web.json_response(dict(session))
+
+    storage = RedisStorage(redis, codec=MsgpackCodec())
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 1}
+    resp = await client.get("/")
+    assert await resp.json() == {"n": 2}
+    cookies = client.session.cookie_jar.filter_cookies(client.make_url("/"))
+    value = await redis.get("AIOHTTP_SESSION_" + cookies["AIOHTTP_SESSION"].value)
+    assert msgpack.unpackb(value)["session"] == {"n": 2}
@@ -159,3 +159,72 @@ def test_change() -> None:
     # Mypy bug: https://github.com/python/mypy/issues/11853
     assert s.created == created  # type: ignore[unreachable]
     assert cast(MutableMapping[str, Any], {"a": {"key": "value", "key2": "val2"}}) == s
+
+
+def test_delta() -> None:
+    s = Session(
+        "test_identity",
+        new=False,
+        data={"session": {"a": 1, "b": 2}, "created": int(time.time())},
+    )
+    assert s.delta == {"updated": {}, "deleted": frozenset()}
+
+    s["c"] = 3
+    del s["a"]
+    assert s.delta == {"updated": {"c": 3}, "deleted": frozenset({"a"})}
+
+    s["a"] = 4
+    del s["c"]
+    assert s.delta == {"updated": {"a": 4}, "deleted": frozenset({"c"})}
+
+
+def test_delta_for_new_session() -> None:
+    s = Session("test_identity", data=None, new=True)
+    s["a"] = 1
+    assert s.delta is None
+
+
+def test_delta_after_changed() -> None:
+    s = Session("test_identity", data={"session": {"a": []}}, new=False)
+    s["a"].append(1)
+    s.changed()
+    assert s.delta is None
+
+
+def test_delta_after_invalidate() -> None:
+    s = Session("test_identity", data={"session": {"a": 1}}, new=False)
+    s.invalidate()
+    assert s.delta is None
+
+
+def test_lazy_load() -> None:
+    calls = []
+
+    def loader() -> SessionData:
+        calls.append(1)
+        return {"session": {"a": 1}, "created": int(time.time())}
+
+    s = Session("test_identity", data=None, new=False, loader=loader)
+    assert calls == []
+    assert s.max_age is None
+    assert calls == []
+
+    assert s["a"] == 1
+    assert s == cast(MutableMapping[str, Any], {"a": 1})
+    assert not s.new
+    assert calls == [1]
+
+
+def test_lazy_load_empty_data() -> None:
+    s = Session("test_identity", data=None, new=False, loader=lambda: {})
+    assert s.new
+    assert s.identity is None
+    assert s.empty
+
+
+def test_lazy_load_bad_data() -> None:
+    s = Session("test_identity", data=None, new=False, loader=lambda: None)
+    assert not s.new
+    assert s.identity == "test_identity"
+    assert s == cast(MutableMapping[str, Any], {})
+    assert s.delta is None
@@ -1,9 +1,195 @@
+import asyncio
+
 import pytest
+from aiohttp import web
+
+from aiohttp_session import (
+    PREFETCH_KEY,
+    STORAGE_KEY,
+    Session,
+    SessionDelta,
+    SimpleCookieStorage,
+    get_session,
+    session_middleware,
+    setup as setup_middleware,
+)
+
+from .test_abstract_storage import make_cookie
+from .typedefs import AiohttpClient
+
 
-from aiohttp_session import session_middleware
+class DeltaStorage(SimpleCookieStorage):
+    def __init__(self) -> None:
+        super().__init__()
+        self.full_saves = 0
+        self.deltas: list[SessionDelta] = []
+
+    async def save_session(
+        self, request: web.Request, response: web.StreamResponse, session: Session
+    ) -> None:
+        self.full_saves += 1
+        await super().save_session(request, response, session)
+
+    async def save_session_delta(
+        self,
+        request: web.Request,
+        response: web.StreamResponse,
+        session: Session,
+        delta: SessionDelta,
+    ) -> None:
+        self.deltas.append(delta)
+        await super().save_session_delta(request, response, session, delta)
 
 
 async def test_session_middleware_bad_storage() -> None:
     with pytest.raises(RuntimeError):
         # Ignoring typing since parameter type is wrong on purpose
         session_middleware(None)  # type: ignore[arg-type]
+
+
+async def test_save_session_delta(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["c"] = 3
+        del session["a"]
+        return web.Response(body=b"OK")
+
+    storage = DeltaStorage()
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    make_cookie(client, {"a": 1, "b": 2})
+    async with client.get("/") as resp:
+        assert resp.status == 200
+        assert "AIOHTTP_SESSION" in resp.cookies
+
+    assert storage.deltas == [{"updated": {"c": 3}, "deleted": frozenset({"a"})}]
+    # The default implementation falls back to a full save.
+    assert storage.full_saves == 1
+
+
+async def test_new_session_saved_in_full(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["c"] = 3
+        return web.Response(body=b"OK")
+
+    storage = DeltaStorage()
+    app = web.Application(middlewares=[session_middleware(storage)])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    async with client.get("/") as resp:
+        assert resp.status == 200
+
+    assert storage.deltas == []
+    assert storage.full_saves == 1
+
+
+class SlowStorage(SimpleCookieStorage):
+    def __init__(self) -> None:
+        super().__init__()
+        self.loads = 0
+        self.release = asyncio.Event()
+
+    async def load_session(self, request: web.Request) -> Session:
+        self.loads += 1
+        await self.release.wait()
+        return await super().load_session(request)
+
+
+async def test_prefetch(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        # The load was started by the middleware before the handler.
+        assert isinstance(request[PREFETCH_KEY], asyncio.Task)
+        await asyncio.sleep(0)
+        assert storage.loads == 1
+        storage.release.set()
+        session = await get_session(request)
+        assert session["a"] == 1
+        assert PREFETCH_KEY not in request
+        return web.Response(body=b"OK")
+
+    storage = SlowStorage()
+    app = web.Application()
+    setup_middleware(app, storage, prefetch=True)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    make_cookie(client, {"a": 1})
+    async with client.get("/") as resp:
+        assert resp.status == 200
+    assert storage.loads == 1
+
+
+async def test_prefetch_without_cookie(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        assert PREFETCH_KEY not in request
+        storage.release.set()
+        session = await get_session(request)
+        assert session.new
+        return web.Response(body=b"OK")
+
+    storage = SlowStorage()
+    app = web.Application()
+    setup_middleware(app, storage, prefetch=True)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    async with client.get("/") as resp:
+        assert resp.status == 200
+
+
+async def test_prefetch_not_used(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        prefetched.append(request[PREFETCH_KEY])
+        return web.Response(body=b"OK")
+
+    prefetched: list[asyncio.Task[Session]] = []
+    storage = SlowStorage()
+    app = web.Application()
+    setup_middleware(app, storage, prefetch=True)
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    make_cookie(client, {"a": 1})
+    async with client.get("/") as resp:
+        assert resp.status == 200
+    await asyncio.sleep(0)
+    assert prefetched[0].cancelled()
+
+
+async def test_exclude_paths_and_routes(aiohttp_client: AiohttpClient) -> None:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 1
+        return web.Response(body=b"OK")
+
+    async def excluded(request: web.Request) -> web.StreamResponse:
+        assert STORAGE_KEY not in request
+        with pytest.raises(RuntimeError):
+            await get_session(request)
+        return web.Response(body=b"OK")
+
+    app = web.Application()
+    setup_middleware(
+        app,
+        SimpleCookieStorage(),
+        exclude_paths=["/static/", "/health", "/assets"],
+        exclude_routes=["metrics"],
+    )
+    app.router.add_route("GET", "/", handler)
+    app.router.add_route("GET", "/static/{name}", excluded)
+    app.router.add_route("GET", "/health", excluded)
+    app.router.add_route("GET", "/assets/{name}", excluded)
+    app.router.add_route("GET", "/healthz", handler)
+    app.router.add_route("GET", "/assetsfoo", handler)
+    app.router.add_route("GET", "/metrics", excluded, name="metrics")
+    client = await aiohttp_client(app)
+
+    for path in ("/static/app.js", "/health", "/assets/app.css", "/metrics"):
+        async with client.get(path) as resp:
+            assert resp.status == 200
+            assert "AIOHTTP_SESSION" not in resp.cookies
+
+    # Prefixes match whole path segments only.
+    for path in ("/", "/healthz", "/assetsfoo"):
+        async with client.get(path) as resp:
+            assert resp.status == 200
+            assert "AIOHTTP_SESSION" in resp.cookies
@@ -0,0 +1,100 @@
+from aiohttp import ClientResponse, web
+from aiohttp.test_utils import make_mocked_request
+from cryptography.fernet import Fernet
+
+from aiohttp_session import SimpleCookieStorage, get_session, session_middleware
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+from aiohttp_session.timing import TIMINGS_KEY, format_server_timing, phase
+
+from .test_abstract_storage import make_cookie
+from .typedefs import AiohttpClient
+
+
+def phases(resp: ClientResponse) -> list[str]:
+    return [
+        entry.strip().split(";")[0]
+        for entry in resp.headers.get("Server-Timing", "").split(",")
+        if entry
+    ]
+
+
+async def handler(request: web.Request) -> web.StreamResponse:
+    session = await get_session(request)
+    session["a"] = 2
+    return web.Response(body=b"OK")
+
+
+def test_format_server_timing() -> None:
+    timings = {"decode": 0.0012345, "fetch": 0.5}
+    assert format_server_timing(timings) == (
+        "session-decode;dur=1.234, session-fetch;dur=500.000"
+    )
+
+
+def test_phase() -> None:
+    request = make_mocked_request("GET", "/")
+    with phase(request, "decode"):
+        pass
+    assert TIMINGS_KEY not in request
+
+    request[TIMINGS_KEY] = {}
+    with phase(request, "decode"):
+        pass
+    with phase(request, "decode"):
+        pass
+    assert list(request[TIMINGS_KEY]) == ["decode"]
+    assert request[TIMINGS_KEY]["decode"] >= 0
+
+    with phase(None, "decode"):
+        pass
+
+
+async def test_server_timing(aiohttp_client: AiohttpClient) -> None:
+    timings: dict[str, float] = {}
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        session = await get_session(request)
+        session["a"] = 2
+        timings.update(request[TIMINGS_KEY])
+        return web.Response(body=b"OK")
+
+    middleware = session_middleware(SimpleCookieStorage(), server_timing=True)
+    app = web.Application(middlewares=[middleware])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    make_cookie(client, {"a": 1})
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert phases(resp) == [
+        "session-cookie",
+        "session-decode",
+        "session-load",
+        "session-encode",
+        "session-set_cookie",
+        "session-save",
+    ]
+    assert list(timings) == ["cookie", "decode", "load"]
+
+
+async def test_server_timing_disabled(aiohttp_client: AiohttpClient) -> None:
+    app = web.Application(middlewares=[session_middleware(SimpleCookieStorage())])
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "Server-Timing" not in resp.headers
+
+
+async def test_server_timing_encrypted(aiohttp_client: AiohttpClient) -> None:
+    storage = EncryptedCookieStorage(Fernet(Fernet.generate_key()))
+    app = web.Application(
+        middlewares=[session_middleware(storage, server_timing=True)]
+    )
+    app.router.add_route("GET", "/", handler)
+    client = await aiohttp_client(app)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "session-encrypt" in phases(resp)
+    resp = await client.get("/")
+    assert resp.status == 200
+    assert "session-decrypt" in phases(resp)